@@ -9,22 +9,12 @@ from sqlmodel import Session, select
 from app.db import get_session
 from app.core.security import verify_password, create_access_token_legacy, get_password_hash
 from app.core.config import settings
-from app.models.users import User, Profile
+from app.models.users import User
 from app.models.auth import Token, UserCreate, UserResponse
+from app.repositories import users as user_repo
 
 router = APIRouter()
 
-
-def _ensure_default_profile(session: Session, user_id):
-    profile = session.exec(select(Profile).where(Profile.user_id == user_id)).first()
-    if profile:
-        return profile
-    profile = Profile(user_id=user_id)
-    session.add(profile)
-    session.commit()
-    session.refresh(profile)
-    return profile
-
 @router.post("/login", response_model=Token)
 async def login_access_token_json(
     request: Request,
@@ -115,36 +105,18 @@ def register_user(
     """
     Create new user without the need to be logged in.
     """
-    # 1. Check xem email da ton tai chua
-    user = session.exec(select(User).where(User.email == user_in.email)).first()
-    if user:
-        raise HTTPException(
-            status_code=400,
-            detail="Email nay da duoc su dung trong he thong",
+    # Tao User + Profile mac dinh trong 1 cau lenh, de rang buoc UNIQUE cua DB kiem tra trung lap
+    # user_in.password la pass tho, ta can hash no truoc khi luu
+    try:
+        db_user = user_repo.create_user_with_profile(
+            session, user_in, get_password_hash(user_in.password)
         )
-    
-    # 2. Check xem username da ton tai chua (neu can unique username)
-    user_by_name = session.exec(select(User).where(User.username == user_in.username)).first()
-    if user_by_name:
-        raise HTTPException(
-            status_code=400,
-            detail="Username nay da duoc su dung",
+    except user_repo.DuplicateUserError as exc:
+        detail = (
+            "Email nay da duoc su dung trong he thong"
+            if exc.field == "email"
+            else "Username nay da duoc su dung"
         )
+        raise HTTPException(status_code=400, detail=detail)
 
-    # 3. Tao User moi (hash password)
-    # user_in.password la pass tho, ta can hash no truoc khi luu
-    db_user = User.model_validate(
-        user_in,
-        update={"hashed_password": get_password_hash(user_in.password)}
-    )
-    
-    # Gan cac gia tri mac dinh neu model chua co
-    # db_user.total_points = 0 # Neu trong model User chua set default
-    
-    session.add(db_user)
-    session.commit()
-    session.refresh(db_user)
-
-    _ensure_default_profile(session, db_user.id)
-    
     return db_user
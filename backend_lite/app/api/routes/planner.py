@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import ORJSONResponse
 from uuid import UUID
 from typing import List, Optional
 
 from sqlmodel import Session
 from app.api.deps import get_db, get_current_user
+from app.core.config import settings
 from app.models.users import User
 from app.models.financial_plans import (
     PlanCreate,
@@ -14,7 +16,15 @@ from app.models.financial_plans import (
     PlanNode,
     PlanStatus,
 )
+from app.repositories import ai_plans as ai_plan_repo
+from app.utils.planner_client import (
+    PlannerRejectedError,
+    PlannerServiceError,
+    fetch_task_result,
+    submit_plan,
+)
 from app.utils.planner_logic import generate_plan_nodes
+from app.utils.serializers import group_nodes, plan_response, plan_list_response
 from sqlmodel import select
 
 router = APIRouter()
@@ -33,14 +43,7 @@ def initialize_plan(
 
     nodes = generate_plan_nodes(session, plan.id, current_user.id)
 
-    return PlanResponse(
-        id=plan.id,
-        user_id=plan.user_id,
-        name=plan.name,
-        status=plan.status,
-        created_at=plan.created_at,
-        nodes=[PlanNodeResponse.model_validate(node) for node in nodes]
-    )
+    return plan_response(plan, nodes, status_code=201)
 
 
 @router.get("", response_model=List[PlanResponse])
@@ -57,23 +60,16 @@ def list_plans(
         .order_by(FinancialPlan.created_at.desc())
     ).all()
 
-    result = []
-    for plan in plans:
+    # Node cua moi plan lay trong mot truy van (thay vi mot truy van cho moi plan), gom lai theo plan_id
+    nodes = []
+    if plans:
         nodes = session.exec(
             select(PlanNode)
-            .where(PlanNode.plan_id == plan.id)
+            .where(PlanNode.plan_id.in_([plan.id for plan in plans]))
             .order_by(PlanNode.created_at)
         ).all()
-        result.append(PlanResponse(
-            id=plan.id,
-            user_id=plan.user_id,
-            name=plan.name,
-            status=plan.status,
-            created_at=plan.created_at,
-            nodes=[PlanNodeResponse.model_validate(node) for node in nodes]
-        ))
 
-    return result
+    return plan_list_response(group_nodes(plans, nodes))
 
 
 @router.get("/plans", response_model=List[PlanResponse])
@@ -120,14 +116,7 @@ def get_plan(
         .order_by(PlanNode.created_at)
     ).all()
 
-    return PlanResponse(
-        id=plan.id,
-        user_id=plan.user_id,
-        name=plan.name,
-        status=plan.status,
-        created_at=plan.created_at,
-        nodes=[PlanNodeResponse.model_validate(node) for node in nodes]
-    )
+    return plan_response(plan, nodes)
 
 
 @router.post("/generate", response_model=PlanResponse, status_code=201)
@@ -142,14 +131,75 @@ def generate_plan(
 
     nodes = generate_plan_nodes(session, plan.id, current_user.id)
 
-    return PlanResponse(
-        id=plan.id,
-        user_id=plan.user_id,
-        name=plan.name,
-        status=plan.status,
-        created_at=plan.created_at,
-        nodes=[PlanNodeResponse.model_validate(node) for node in nodes]
-    )
+    return plan_response(plan, nodes, status_code=201)
+
+
+# Gui yeu cau sinh ke hoach tuan bang AI: input cua planner_agent duoc dung tu Profile va giao
+# dich gan day ngay tren server (client khong phai tu ghep va upload payload)
+@router.post("/ai", status_code=202)
+def request_ai_plan(
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_db)
+):
+    payload = ai_plan_repo.build_planner_payload(session, current_user.id)
+    if payload is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    # Tra ket noi DB ve pool truoc khi cho planner_agent
+    session.close()
+
+    try:
+        task = submit_plan(payload)
+    except PlannerRejectedError as exc:
+        headers = {"Retry-After": exc.retry_after} if exc.retry_after else None
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail, headers=headers)
+    except PlannerServiceError as exc:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(exc))
+
+    task["ingest_url"] = f"{settings.API_STR}/planner/ai/{task['task_id']}"
+    return ORJSONResponse(task, status_code=202)
+
+
+# Nhap ke hoach tuan da sinh xong cua planner_agent thanh PlanNode, sau do doc qua cac route
+# planner thuong (GET /{plan_id}, GET ""). Goi lai voi cung task_id tra ve plan da nhap (200).
+@router.post("/ai/{task_id}", response_model=PlanResponse, status_code=201)
+def ingest_ai_plan(
+    task_id: str,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_db)
+):
+    existing = ai_plan_repo.find_ingested_plan(session, current_user.id, task_id)
+    if existing:
+        nodes = session.exec(
+            select(PlanNode)
+            .where(PlanNode.plan_id == existing.id)
+            .order_by(PlanNode.created_at)
+        ).all()
+        return plan_response(existing, nodes)
+
+    try:
+        result = fetch_task_result(task_id)
+    except PlannerServiceError as exc:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(exc))
+
+    if result is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="AI task not found")
+    if result.get("user_id") != str(current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access this AI task"
+        )
+    if result.get("status") != "COMPLETED":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"AI plan is not ready (status: {result.get('status')})"
+        )
+
+    try:
+        plan, nodes, created = ai_plan_repo.ingest_ai_plan(session, current_user.id, task_id, result)
+    except ai_plan_repo.InvalidAIPlanError as exc:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc))
+
+    return plan_response(plan, nodes, status_code=201 if created else 200)
 
 
 @router.patch("/nodes/{node_id}", response_model=PlanNodeResponse)
@@ -226,11 +276,4 @@ def regenerate_plan(
     session.commit()
     nodes = generate_plan_nodes(session, plan.id, current_user.id)
 
-    return PlanResponse(
-        id=plan.id,
-        user_id=plan.user_id,
-        name=plan.name,
-        status=plan.status,
-        created_at=plan.created_at,
-        nodes=[PlanNodeResponse.model_validate(node) for node in nodes]
-    )
+    return plan_response(plan, nodes)
@@ -1,9 +1,8 @@
-from datetime import datetime
 from typing import Optional
 from uuid import uuid4
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
+from sqlmodel import Session
 
 from app.api.deps import get_current_user
 from app.db import get_session
@@ -16,44 +15,26 @@ from app.models.users import (
     FixedExpenseCreate,
     FixedExpenseUpdate,
 )
+from app.repositories import profiles as profile_repo
 
 router = APIRouter()
 
 
-def _get_profile(session: Session, user_id) -> Optional[Profile]:
-    return session.exec(select(Profile).where(Profile.user_id == user_id)).first()
-
-
-def _ensure_default_profile(session: Session, user_id) -> Profile:
-    profile = _get_profile(session, user_id)
-    if profile:
-        return profile
-    profile = Profile(user_id=user_id)
-    session.add(profile)
-    session.commit()
-    session.refresh(profile)
+def _require_profile(profile: Optional[Profile]) -> Profile:
+    if not profile:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found",
+        )
     return profile
 
 
-def _normalize_fixed_expenses(expenses: Optional[list[FixedExpenseCreate]]) -> list[dict]:
-    if not expenses:
-        return []
-
-    normalized = []
-    for expense in expenses:
-        payload = expense.model_dump()
-        payload["id"] = payload.get("id") or str(uuid4())
-        normalized.append(payload)
-    return normalized
-
-
 @router.get("", response_model=ProfileResponse)
 def get_profile(
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session),
 ):
-    profile = _ensure_default_profile(session, current_user.id)
-    return profile
+    return profile_repo.ensure_profile(session, current_user.id)
 
 @router.put("", response_model=ProfileResponse)
 def update_profile(
@@ -61,43 +42,7 @@ def update_profile(
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session),
 ):
-    profile = _get_profile(session, current_user.id)
-    if not profile:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Profile not found",
-        )
-
-    if profile_data.age is not None:
-        profile.age = profile_data.age
-    if profile_data.gender is not None:
-        profile.gender = profile_data.gender
-    if profile_data.occupation is not None:
-        profile.occupation = profile_data.occupation
-    if profile_data.education_level is not None:
-        profile.education_level = profile_data.education_level
-    if profile_data.dependents is not None:
-        profile.dependents = profile_data.dependents
-    if profile_data.monthly_income is not None:
-        profile.monthly_income = profile_data.monthly_income
-    if profile_data.other_income is not None:
-        profile.other_income = profile_data.other_income
-    if profile_data.current_savings is not None:
-        profile.current_savings = profile_data.current_savings
-    if profile_data.current_debt is not None:
-        profile.current_debt = profile_data.current_debt
-    if profile_data.fixed_expenses is not None:
-        profile.fixed_expenses = _normalize_fixed_expenses(profile_data.fixed_expenses)
-    if profile_data.goals is not None:
-        profile.goals = profile_data.goals
-    if profile_data.risk_tolerance is not None:
-        profile.risk_tolerance = profile_data.risk_tolerance
-    profile.updated_at = datetime.utcnow()
-
-    session.add(profile)
-    session.commit()
-    session.refresh(profile)
-    return profile
+    return profile_repo.upsert_profile(session, current_user.id, profile_data)
 
 
 @router.get("/fixed-expenses", response_model=list[FixedExpense])
@@ -105,12 +50,7 @@ def list_fixed_expenses(
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session),
 ):
-    profile = _get_profile(session, current_user.id)
-    if not profile:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Profile not found",
-        )
+    profile = _require_profile(profile_repo.get_profile(session, current_user.id))
     return profile.fixed_expenses or []
 
 
@@ -120,13 +60,6 @@ def add_fixed_expense(
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session),
 ):
-    profile = _get_profile(session, current_user.id)
-    if not profile:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Profile not found",
-        )
-
     expense = FixedExpense(
         id=str(uuid4()),
         name=expense_data.name,
@@ -135,14 +68,9 @@ def add_fixed_expense(
         description=expense_data.description,
     )
 
-    expenses = list(profile.fixed_expenses or [])
-    expenses.append(expense.model_dump())
-    profile.fixed_expenses = expenses
-    profile.updated_at = datetime.utcnow()
-
-    session.add(profile)
-    session.commit()
-    session.refresh(profile)
+    _require_profile(
+        profile_repo.append_fixed_expense(session, current_user.id, expense.model_dump())
+    )
     return expense
 
 
@@ -153,36 +81,18 @@ def update_fixed_expense(
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session),
 ):
-    profile = _get_profile(session, current_user.id)
-    if not profile:
+    expense = profile_repo.update_fixed_expense(
+        session,
+        current_user.id,
+        expense_id,
+        expense_data.model_dump(exclude_unset=True, exclude_none=True),
+    )
+    if expense is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Profile not found",
+            detail="Fixed expense not found",
         )
-
-    expenses = list(profile.fixed_expenses or [])
-    for expense in expenses:
-        if expense.get("id") == expense_id:
-            if expense_data.name is not None:
-                expense["name"] = expense_data.name
-            if expense_data.category is not None:
-                expense["category"] = expense_data.category
-            if expense_data.amount is not None:
-                expense["amount"] = expense_data.amount
-            if expense_data.description is not None:
-                expense["description"] = expense_data.description
-
-            profile.fixed_expenses = expenses
-            profile.updated_at = datetime.utcnow()
-            session.add(profile)
-            session.commit()
-            session.refresh(profile)
-            return FixedExpense(**expense)
-
-    raise HTTPException(
-        status_code=status.HTTP_404_NOT_FOUND,
-        detail="Fixed expense not found",
-    )
+    return FixedExpense(**expense)
 
 
 @router.delete("/fixed-expenses/{expense_id}", response_model=dict)
@@ -191,23 +101,9 @@ def delete_fixed_expense(
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session),
 ):
-    profile = _get_profile(session, current_user.id)
-    if not profile:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Profile not found",
-        )
-
-    expenses = list(profile.fixed_expenses or [])
-    new_expenses = [expense for expense in expenses if expense.get("id") != expense_id]
-    if len(new_expenses) == len(expenses):
+    if not profile_repo.delete_fixed_expense(session, current_user.id, expense_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Fixed expense not found",
         )
-
-    profile.fixed_expenses = new_expenses
-    profile.updated_at = datetime.utcnow()
-    session.add(profile)
-    session.commit()
     return {"detail": "Fixed expense deleted"}
@@ -8,6 +8,7 @@ from app.models.users import User
 from app.models.transactions import TransactionCreate, TransactionResponse, TransactionSummary
 from sqlmodel import select
 from app.models.transactions import Transaction
+from app.utils.serializers import transaction_list_response
 
 router = APIRouter()
 
@@ -54,7 +55,7 @@ def get_transactions(
     statement = statement.order_by(Transaction.transaction_date.desc())
     statement = statement.offset(skip).limit(limit)
 
-    return session.exec(statement).all()
+    return transaction_list_response(session.exec(statement).all())
 
 
 @router.get("/summary", response_model=TransactionSummary)
@@ -1,53 +1,75 @@
+import json
+from datetime import datetime
+from typing import Iterator, Literal, Optional
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
-from app.db import get_session
-from app.models.users import User, Profile
-from app.models.auth import UserCreate, UserResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session
+from app.db import engine, get_session
+from app.models.users import User, UserDeletionJob, UserDeletionJobResponse
+from app.models.auth import UserCreate, UserResponse, UserPage
+from app.repositories import users as user_repo
+from app.repositories.users import USER_FIELDS
+from app.utils import user_deletion
+from app.utils.pagination import decode_cursor, encode_cursor, json_default
 from app.core.security import get_password_hash
 
 router = APIRouter()
 
-
-def _ensure_default_profile(session: Session, user_id):
-    profile = session.exec(select(Profile).where(Profile.user_id == user_id)).first()
-    if profile:
-        return profile
-    profile = Profile(user_id=user_id)
-    session.add(profile)
-    session.commit()
-    session.refresh(profile)
-    return profile
-
 # 1. API Tao User moi (POST /users)
 @router.post("/", response_model=UserResponse)
 def create_user(user_in: UserCreate, session: Session = Depends(get_session)):
-    # Check for duplicate email
-    existing_user = session.exec(select(User).where(User.email == user_in.email)).first()
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Email da ton tai")
-    
-    # Check for duplicate username
-    existing_username = session.exec(select(User).where(User.username == user_in.username)).first()
-    if existing_username:
-        raise HTTPException(status_code=400, detail="Username da ton tai")
-    
     hashed_password = get_password_hash(user_in.password)
-    db_user = User.model_validate(
-        user_in, 
-        update={"hashed_password": hashed_password} # Map password -> hashed_password
-    )
-    
-    session.add(db_user)
-    session.commit()
-    session.refresh(db_user)
-    _ensure_default_profile(session, db_user.id)
+    try:
+        db_user = user_repo.create_user_with_profile(session, user_in, hashed_password)
+    except user_repo.DuplicateUserError as exc:
+        detail = "Email da ton tai" if exc.field == "email" else "Username da ton tai"
+        raise HTTPException(status_code=400, detail=detail)
     return db_user
 
 # 2. API Lay danh sach User (GET /users)
-@router.get("/", response_model=list[UserResponse])
-def read_users(session: Session = Depends(get_session)):
-    return session.exec(select(User)).all()
+# Phan trang theo cursor (created_at, id), chon truong qua ?fields=, xuat NDJSON qua ?format=ndjson
+@router.get("/", response_model=UserPage)
+def read_users(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Cac truong can lay, cach nhau boi dau phay"),
+    search: Optional[str] = Query(None, description="Loc theo tien to username/email"),
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    format: Literal["json", "ndjson"] = "json",
+    session: Session = Depends(get_session),
+):
+    selected = [name.strip() for name in fields.split(",") if name.strip()] if fields else list(USER_FIELDS)
+    invalid = [name for name in selected if name not in USER_FIELDS]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Truong khong hop le: {', '.join(invalid)}")
+
+    filters = {
+        "search": search,
+        "created_after": created_after,
+        "created_before": created_before,
+    }
+
+    if format == "ndjson":
+        return StreamingResponse(_stream_users(selected, filters), media_type="application/x-ndjson")
+
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Cursor khong hop le")
+
+    items, next_key = user_repo.list_users(session, selected, limit, after=after, **filters)
+    return UserPage(items=items, next_cursor=encode_cursor(*next_key) if next_key else None)
+
+
+def _stream_users(fields: list[str], filters: dict) -> Iterator[str]:
+    # Session cua dependency da dong khi response bat dau stream, nen mo session rieng
+    with Session(engine) as session:
+        for row in user_repo.iter_users(session, fields, **filters):
+            yield json.dumps(row, default=json_default, ensure_ascii=False) + "\n"
 
 # 3. API Lay thong tin User theo UUID (GET /users/{user_id})
 @router.get("/{user_id}", response_model=UserResponse)
@@ -58,14 +80,36 @@ def read_user(user_id: UUID, session: Session = Depends(get_session)):
     return user
 
 # 4. API Xoa User theo UUID (DELETE /users/{user_id})
-@router.delete("/{user_id}", response_model=dict)
-def delete_user(user_id: UUID, session: Session = Depends(get_session)):
+# Xoa chay nen theo tung lo, tra ve job de client theo doi tien do
+@router.delete("/{user_id}", response_model=UserDeletionJobResponse, status_code=202)
+def delete_user(
+    user_id: UUID,
+    background_tasks: BackgroundTasks,
+    session: Session = Depends(get_session),
+):
+    job = user_deletion.find_active_job(session, user_id)
+    if job:
+        # Job bi bo do do process restart: nhan lai va chay tiep thay vi tra ve job dung mai
+        if user_deletion.claim_stale_job(session, job.id):
+            background_tasks.add_task(user_deletion.run_user_deletion, job.id)
+        return job
+
     user = session.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User khong ton tai")
-    session.delete(user)
-    session.commit()
-    return {"detail": "User da duoc xoa"}
+
+    job, created = user_deletion.create_deletion_job(session, user_id)
+    if created:
+        background_tasks.add_task(user_deletion.run_user_deletion, job.id)
+    return job
+
+# 4b. API Theo doi tien do xoa User (GET /users/deletion-jobs/{job_id})
+@router.get("/deletion-jobs/{job_id}", response_model=UserDeletionJobResponse)
+def read_deletion_job(job_id: UUID, session: Session = Depends(get_session)):
+    job = session.get(UserDeletionJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job khong ton tai")
+    return job
 
 # 5. API Cap nhat thong tin User theo UUID (PUT /users/{user_id})
 @router.patch("/{user_id}", response_model=UserResponse)
@@ -45,5 +45,30 @@ class Settings(BaseSettings):
     POINTS_PER_CHECK_IN: int = 10
     STREAK_BONUS_POINTS: int = 5
 
+    # Background jobs
+    USER_DELETION_BATCH_SIZE: int = 1000
+    # Job PENDING/RUNNING khong cap nhat qua so giay nay (process bi restart giua chung) thi chay lai
+    USER_DELETION_STALE_S: int = 300
+    USER_DELETION_SWEEP_S: int = 60
+
+    # Logging (app/core/log.py)
+    LOG_LEVEL: str = "INFO"
+    LOG_QUEUE_SIZE: int = 10000
+    # Ti le access log duoc ghi; loi 5xx va request cham hon SLOW_REQUEST_MS luon duoc ghi
+    LOG_REQUEST_SAMPLE_RATE: float = 0.1
+    SLOW_REQUEST_MS: float = 1000
+    # In moi cau SQL ra stdout (chi dung khi debug, rat cham khi tai cao)
+    SQL_ECHO: bool = False
+
+    # Metrics (/metrics, app/core/metrics.py)
+    METRICS_ENABLED: bool = True
+    # Mot cau SQL lap lai tu nguong nay tro len trong mot request thi bi danh dau N+1
+    N_PLUS_ONE_THRESHOLD: int = 5
+
+    # planner_agent (sinh ke hoach tuan bang AI)
+    PLANNER_AGENT_URL: str = "http://planner_agent:8000"
+    PLANNER_AGENT_TIMEOUT_S: float = 10.0
+    PLANNER_AGENT_MAX_CONNECTIONS: int = 20
+
 # Khoi tao settings
 settings = Settings()
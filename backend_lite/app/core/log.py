@@ -0,0 +1,140 @@
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from app.core.config import settings
+
+# Log JSON moi dong mot ban ghi. Handler tren thread xu ly request chi day LogRecord vao queue;
+# format + ghi stdout chay o thread cua QueueListener. Queue day thi bo ban ghi, khong bao gio cho.
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+# Thuoc tinh co san cua LogRecord; phan con lai (truyen qua extra=) la truong co cau truc
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sample_rate"}
+
+_listener: Optional[QueueListener] = None
+logger = logging.getLogger("app.access")
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and value is not None:
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # extra={"sample_rate": 0.1}: chi giu lai mot phan su kien tan suat cao
+        sample_rate = getattr(record, "sample_rate", None)
+        if sample_rate is not None and random.random() >= sample_rate:
+            return False
+        # Context var phai doc o thread phat log, thread ghi khong thay
+        record.__dict__.setdefault("request_id", request_id_var.get())
+        return super().filter(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Khong format o day (QueueHandler mac dinh format ngay tren thread goi)
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging() -> None:
+    """Attach the queue handler to the root logger (once per process)."""
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter())
+    _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+
+    root = logging.getLogger()
+    root.handlers = [_NonBlockingQueueHandler(log_queue)]
+    root.setLevel(settings.LOG_LEVEL.upper())
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware: set ``request_id`` (from ``X-Request-ID`` or a new one) for each request,
+    echo it in the response and write a sampled access log line.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or ())
+        request_id = (headers.get(b"x-request-id") or b"").decode("latin-1")[:64] or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        started = time.perf_counter()
+        finished = None
+        status_code = 500
+
+        async def send_with_id(message):
+            nonlocal status_code, finished
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [*message.get("headers", ()), (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+            # BackgroundTasks chay sau body cuoi, khong tinh vao thoi gian request
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finished = time.perf_counter()
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            duration_ms = ((finished or time.perf_counter()) - started) * 1000
+            # Loi 5xx va request cham luon ghi; con lai lay mau theo LOG_REQUEST_SAMPLE_RATE
+            always = status_code >= 500 or duration_ms >= settings.SLOW_REQUEST_MS
+            logger.info(
+                "request",
+                extra={
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status_code": status_code,
+                    "duration_ms": round(duration_ms, 2),
+                    "sample_rate": None if always else settings.LOG_REQUEST_SAMPLE_RATE,
+                },
+            )
+            request_id_var.reset(token)
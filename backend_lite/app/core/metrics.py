@@ -0,0 +1,223 @@
+import contextvars
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+# Metrics kieu Prometheus (text exposition 0.0.4) giu trong process, khong them dependency.
+# Chi phi moi request: vai lan perf_counter + mot lock ngan khi ghi histogram; moi query: hai
+# lan perf_counter + tang mot bo dem. Du nhe de luon bat.
+
+logger = logging.getLogger(__name__)
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+_UNMATCHED_ROUTE = "<unmatched>"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values: tuple = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...], buckets: tuple[float, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        # labels -> [so quan sat cua tung bucket (khong cong don)..., +Inf, sum]
+        self._series: dict[tuple, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values: tuple, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            snapshot = [(labels, list(series)) for labels, series in self._series.items()]
+        for label_values, series in snapshot:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), series[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, label_values)} {series[-1]}"
+            yield f"{self.name}_count{_format_labels(self.labels, label_values)} {cumulative}"
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route"), _LATENCY_BUCKETS
+)
+REQUESTS_TOTAL = Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "SQL statements executed per HTTP request.", ("route",), _QUERY_COUNT_BUCKETS
+)
+QUERY_TIME_PER_REQUEST = Histogram(
+    "db_query_seconds_per_request", "Time spent in SQL per HTTP request.", ("route",), _LATENCY_BUCKETS
+)
+N_PLUS_ONE_TOTAL = Counter(
+    "db_n_plus_one_requests_total",
+    "Requests that ran the same SQL statement at least N_PLUS_ONE_THRESHOLD times.",
+    ("route",),
+)
+_in_progress = 0
+_in_progress_lock = threading.Lock()
+
+
+class _RequestQueries:
+    __slots__ = ("count", "seconds", "statements", "closed")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: dict[str, int] = {}
+        # Da gui xong response: query cua BackgroundTasks chay sau do khong tinh vao request
+        self.closed = False
+
+
+# Bo dem query cua request hien tai. Route sync chay trong threadpool voi ban sao context,
+# nhung van tro toi cung object nen middleware doc duoc ket qua.
+_current_queries: contextvars.ContextVar[Optional[_RequestQueries]] = contextvars.ContextVar(
+    "current_queries", default=None
+)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    queries = _current_queries.get()
+    if queries is None or queries.closed:
+        return
+    queries.count += 1
+    queries.seconds += time.perf_counter() - started
+    # Cung cau SQL (tham so nam rieng) lap lai nhieu lan trong mot request -> nghi N+1
+    queries.statements[statement] = queries.statements.get(statement, 0) + 1
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Count SQL statements and their time for the request that issued them."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _pool_gauges(engine: Engine) -> Iterable[str]:
+    pool = engine.pool
+    gauges = (
+        ("db_pool_size", "Configured connection pool size.", "size"),
+        ("db_pool_checked_out", "Connections currently checked out of the pool.", "checkedout"),
+        ("db_pool_checked_in", "Idle connections in the pool.", "checkedin"),
+        ("db_pool_overflow", "Connections opened beyond pool_size.", "overflow"),
+    )
+    for name, documentation, method in gauges:
+        if hasattr(pool, method):
+            yield f"# HELP {name} {documentation}"
+            yield f"# TYPE {name} gauge"
+            yield f"{name} {getattr(pool, method)()}"
+
+
+def render_metrics(engine: Engine) -> str:
+    lines = ["# HELP http_requests_in_progress HTTP requests being handled.",
+             "# TYPE http_requests_in_progress gauge",
+             f"http_requests_in_progress {_in_progress}"]
+    for metric in (REQUEST_DURATION, REQUESTS_TOTAL, QUERIES_PER_REQUEST, QUERY_TIME_PER_REQUEST, N_PLUS_ONE_TOTAL):
+        lines.extend(metric.render())
+    lines.extend(_pool_gauges(engine))
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and SQL usage per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _in_progress
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        queries = _RequestQueries()
+        token = _current_queries.set(queries)
+        started = time.perf_counter()
+        finished = None
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code, finished
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                # BackgroundTasks chay trong response, sau body cuoi: dung dong ho va bo dem o day.
+                # Danh dau tren object (khong reset contextvar) vi send co the chay o context khac
+                finished = time.perf_counter()
+                queries.closed = True
+
+        with _in_progress_lock:
+            _in_progress += 1
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            with _in_progress_lock:
+                _in_progress -= 1
+            _current_queries.reset(token)
+            # Dung path mau cua route ("/api/planner/{plan_id}") de so series khong tang theo id
+            route = getattr(scope.get("route"), "path", None) or _UNMATCHED_ROUTE
+            method = scope["method"]
+            REQUEST_DURATION.observe((method, route), (finished or time.perf_counter()) - started)
+            REQUESTS_TOTAL.inc((method, route, str(status_code)))
+            QUERIES_PER_REQUEST.observe((route,), queries.count)
+            QUERY_TIME_PER_REQUEST.observe((route,), queries.seconds)
+            if queries.statements:
+                statement, repeats = max(queries.statements.items(), key=lambda item: item[1])
+                if repeats >= settings.N_PLUS_ONE_THRESHOLD:
+                    N_PLUS_ONE_TOTAL.inc((route,))
+                    logger.warning(
+                        "Repeated SQL statement in one request (possible N+1)",
+                        extra={"route": route, "repeats": repeats, "statement": statement[:200], "sample_rate": 0.1},
+                    )
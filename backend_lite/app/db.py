@@ -3,8 +3,8 @@ from sqlmodel import SQLModel, create_engine, Session
 from app.core.config import settings
 
 # 1. Tao Engine ket noi
-# echo=True de khi chay no in cau lenh SQL ra terminal cho ban de debug
-engine = create_engine(settings.DATABASE_URL, echo=True)
+# SQL_ECHO=true de in cau lenh SQL ra terminal khi debug (ghi dong bo, tat khi chay that)
+engine = create_engine(settings.DATABASE_URL, echo=settings.SQL_ECHO)
 
 # 2. Ham khoi tao Database (Tao bang)
 def init_db():
@@ -18,6 +18,7 @@ def recreate_db():
     SQLModel.metadata.create_all(engine)
 
 # 3. Dependency de lay Session (Dung trong API)
+# expire_on_commit=False: giu lai du lieu da RETURNING sau commit, tranh SELECT lai khi serialize
 def get_session():
-    with Session(engine) as session:
+    with Session(engine, expire_on_commit=False) as session:
         yield session
@@ -1,24 +1,49 @@
 # backend_lite/app/main.py
+import asyncio
+import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.db import init_db
+from app.db import engine, init_db
+from app.core.metrics import MetricsMiddleware, instrument_engine, render_metrics
+from app.core.log import RequestIdMiddleware, setup_logging, shutdown_logging
+from app.utils import user_deletion
+from app.utils.planner_client import close_client
 from fastapi import APIRouter
 from app.api.routes import auth, users, profile, transactions, planner, gamification, chat
 from app.core.config import settings
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+async def _resume_deletion_jobs():
+    # Job xoa user chay bang BackgroundTasks trong process: restart giua chung thi job nam yen o
+    # PENDING/RUNNING. Dinh ky nhan lai job khong cap nhat qua USER_DELETION_STALE_S va chay tiep
+    while True:
+        try:
+            await asyncio.to_thread(user_deletion.resume_stale_jobs)
+        except Exception:
+            logger.exception("User deletion sweep failed")
+        await asyncio.sleep(settings.USER_DELETION_SWEEP_S)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Khi app khoi dong -> Tao bang
-    print("Creating tables...")
+    setup_logging()
+    logger.info("Creating tables...")
     init_db()
+    user_deletion.ensure_active_job_index()
+    sweeper = asyncio.create_task(_resume_deletion_jobs())
     yield
-    # Khi app tat -> Lam gi do (neu can)
+    sweeper.cancel()
+    # Khi app tat -> Dong cac ket noi keep-alive toi planner_agent
+    close_client()
+    shutdown_logging()
 
-app = FastAPI(title="Filanner Lite", lifespan=lifespan)
+app = FastAPI(title="Filanner Lite", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Add CORS middleware
 app.add_middleware(
@@ -28,6 +53,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if settings.METRICS_ENABLED:
+    instrument_engine(engine)
+    app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestIdMiddleware)
 
 app.include_router(users, prefix=f"{settings.API_STR}/users", tags=["Users"])
 app.include_router(auth, prefix=f"{settings.API_STR}/auth", tags=["Authentication"])
@@ -37,6 +66,10 @@ app.include_router(planner, prefix=f"{settings.API_STR}/planner", tags=["Financi
 app.include_router(gamification, prefix=f"{settings.API_STR}/gamification", tags=["Gamification"])
 app.include_router(chat, prefix=f"{settings.API_STR}/chat", tags=["AI Advisor"])
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(render_metrics(engine), media_type="text/plain; version=0.0.4")
+
 @app.get("/health", include_in_schema=False)
 def health_check():
     return {"status": "ok"}
@@ -7,8 +7,11 @@ from app.models.users import (
     FixedExpense,
     FixedExpenseCreate,
     FixedExpenseUpdate,
+    DeletionJobStatus,
+    UserDeletionJob,
+    UserDeletionJobResponse,
 )
-from app.models.auth import UserCreate, UserLogin, Token, TokenData, UserResponse
+from app.models.auth import UserCreate, UserLogin, Token, TokenData, UserResponse, UserPage
 from app.models.transactions import (
     Transaction,
     TransactionType,
@@ -48,11 +51,15 @@ __all__ = [
     "FixedExpense",
     "FixedExpenseCreate",
     "FixedExpenseUpdate",
+    "DeletionJobStatus",
+    "UserDeletionJob",
+    "UserDeletionJobResponse",
     "UserCreate",
     "UserLogin",
     "Token",
     "TokenData",
     "UserResponse",
+    "UserPage",
     "Transaction",
     "TransactionType",
     "TransactionCategory",
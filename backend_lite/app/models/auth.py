@@ -2,7 +2,7 @@ from sqlmodel import SQLModel
 from pydantic import EmailStr
 from uuid import UUID
 from datetime import datetime
-from typing import Optional
+from typing import Any, Optional
 
 
 class UserCreate(SQLModel):
@@ -39,3 +39,9 @@ class UserResponse(SQLModel):
 
     class Config:
         from_attributes = True
+
+
+class UserPage(SQLModel):
+    """Schema for one cursor page of the user listing."""
+    items: list[dict[str, Any]]
+    next_cursor: Optional[str] = None
@@ -33,7 +33,7 @@ class FinancialPlan(SQLModel, table=True):
     __tablename__ = "financial_plans"
 
     id: UUID = Field(default_factory=uuid4, primary_key=True)
-    user_id: UUID = Field(foreign_key="users.id", index=True)
+    user_id: UUID = Field(foreign_key="users.id", ondelete="CASCADE", index=True)
     name: str = Field(max_length=255)  # "Plan mua nha 2025"
     status: str = Field(default=PlanStatus.ACTIVE.value, max_length=20)
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -45,8 +45,8 @@ class PlanNode(SQLModel, table=True):
     __tablename__ = "plan_nodes"
 
     id: UUID = Field(default_factory=uuid4, primary_key=True)
-    plan_id: UUID = Field(foreign_key="financial_plans.id", index=True)
-    parent_node_id: Optional[UUID] = Field(default=None, foreign_key="plan_nodes.id")
+    plan_id: UUID = Field(foreign_key="financial_plans.id", ondelete="CASCADE", index=True)
+    parent_node_id: Optional[UUID] = Field(default=None, foreign_key="plan_nodes.id", ondelete="SET NULL")
     title: str = Field(max_length=255)
     node_type: str = Field(max_length=20)
     target_amount: Optional[float] = Field(default=None, ge=0)
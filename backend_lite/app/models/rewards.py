@@ -23,7 +23,7 @@ class DailyCheckIn(SQLModel, table=True):
     __tablename__ = "daily_check_ins"
 
     id: UUID = Field(default_factory=uuid4, primary_key=True)
-    user_id: UUID = Field(foreign_key="users.id", index=True)
+    user_id: UUID = Field(foreign_key="users.id", ondelete="CASCADE", index=True)
     check_in_date: date = Field(index=True)
     streak_count: int = Field(default=1, ge=0)
 
@@ -34,7 +34,7 @@ class UserReward(SQLModel, table=True):
     __tablename__ = "user_rewards"
 
     id: UUID = Field(default_factory=uuid4, primary_key=True)
-    user_id: UUID = Field(foreign_key="users.id", index=True)
+    user_id: UUID = Field(foreign_key="users.id", ondelete="CASCADE", index=True)
     reward_id: UUID = Field(foreign_key="rewards.id", index=True)
     claimed_at: datetime = Field(default_factory=datetime.utcnow)
 
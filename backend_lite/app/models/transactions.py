@@ -32,7 +32,7 @@ class Transaction(SQLModel, table=True):
     __tablename__ = "transactions"
 
     id: UUID = Field(default_factory=uuid4, primary_key=True)
-    user_id: UUID = Field(foreign_key="users.id", index=True)
+    user_id: UUID = Field(foreign_key="users.id", ondelete="CASCADE", index=True)
     amount: float = Field(ge=0)
     category: str = Field(max_length=50)  # Use TransactionCategory values
     type: str = Field(max_length=20)  # Use TransactionType values
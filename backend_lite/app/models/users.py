@@ -1,9 +1,10 @@
 from sqlmodel import SQLModel, Field, Column
-from sqlalchemy import JSON
+from sqlalchemy import JSON, Index, text
 from pydantic import BaseModel
 from uuid import UUID, uuid4
 from datetime import datetime
 from typing import Optional, List
+from enum import Enum
 
 
 class User(SQLModel, table=True):
@@ -15,7 +16,7 @@ class User(SQLModel, table=True):
     username: str = Field(unique=True, index=True, max_length=100)
     hashed_password: str = Field(max_length=255)
     email: str = Field(unique=True, index=True, max_length=255)
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
     total_points: int = Field(default=0)
 
 
@@ -25,7 +26,7 @@ class Profile(SQLModel, table=True):
     __tablename__ = "profiles"
 
     id: UUID = Field(default_factory=uuid4, primary_key=True)
-    user_id: UUID = Field(foreign_key="users.id", unique=True, index=True)
+    user_id: UUID = Field(foreign_key="users.id", ondelete="CASCADE", unique=True, index=True)
     age: Optional[int] = Field(default=None, ge=0, le=150)
     gender: Optional[str] = Field(default=None, max_length=50)
     occupation: Optional[str] = Field(default=None, max_length=255)
@@ -43,6 +44,40 @@ class Profile(SQLModel, table=True):
     updated_at: Optional[datetime] = Field(default=None)
 
 
+class DeletionJobStatus(str, Enum):
+    """User deletion job status enum."""
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    COMPLETED = "COMPLETED"
+    FAILED = "FAILED"
+
+
+class UserDeletionJob(SQLModel, table=True):
+    """Background job removing a user and all of its dependent rows."""
+
+    __tablename__ = "user_deletion_jobs"
+    # Moi user chi co mot job dang chay: hai DELETE dong thoi khong tao hai job xoa cung cac dong
+    __table_args__ = (
+        Index(
+            "uq_user_deletion_jobs_active",
+            "user_id",
+            unique=True,
+            postgresql_where=text("status IN ('PENDING', 'RUNNING')"),
+        ),
+    )
+
+    id: UUID = Field(default_factory=uuid4, primary_key=True)
+    user_id: UUID = Field(index=True)  # Khong dat foreign key: user se bi xoa truoc job
+    status: str = Field(default=DeletionJobStatus.PENDING.value, max_length=20)
+    total_rows: int = Field(default=0, ge=0)
+    deleted_rows: int = Field(default=0, ge=0)
+    deleted_by_table: dict = Field(default_factory=dict, sa_column=Column(JSON))
+    error_message: Optional[str] = Field(default=None, max_length=1000)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: Optional[datetime] = Field(default=None)
+    finished_at: Optional[datetime] = Field(default=None)
+
+
 class FixedExpense(BaseModel):
     id: str
     name: str
@@ -119,3 +154,20 @@ class ProfileResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class UserDeletionJobResponse(BaseModel):
+    """Schema for user deletion job progress."""
+    id: UUID
+    user_id: UUID
+    status: str
+    total_rows: int
+    deleted_rows: int
+    deleted_by_table: dict
+    error_message: Optional[str]
+    created_at: datetime
+    updated_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,249 @@
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+from uuid import UUID, uuid4
+
+from sqlalchemy import func, insert, true
+from sqlmodel import Session, select
+
+from app.models.financial_plans import FinancialPlan, PlanNode, NodeType, NodeStatus
+from app.models.transactions import Transaction, TransactionCategory, TransactionType
+from app.models.users import User, Profile
+
+# Danh dau node goc cua ke hoach nhap tu planner_agent (node_metadata["source"])
+AI_PLAN_SOURCE = "planner_agent"
+
+# So ngay giao dich gan nhat dung de uoc tinh chi tieu phat sinh hang thang
+RECENT_TRANSACTION_DAYS = 30
+
+# Hoa don va tien gui tiet kiem da nam trong fixed_expenses / muc tieu, khong tinh la phat sinh
+_NON_DISCRETIONARY = (TransactionCategory.BILLS.value, TransactionCategory.SAVINGS.value)
+
+# Nhan ngay theo dinh dang planner_agent doc duoc ("Thứ Hai, 24/01/2026")
+_WEEKDAYS = ("Thứ Hai", "Thứ Ba", "Thứ Tư", "Thứ Năm", "Thứ Sáu", "Thứ Bảy", "Chủ Nhật")
+
+# "Thu Hai (25/01)" hoac "25/01/2026"
+_DAY_MONTH = re.compile(r"(\d{1,2})/(\d{1,2})(?:/(\d{4}))?")
+
+
+class InvalidAIPlanError(ValueError):
+    """Ket qua cua planner_agent khong phai ke hoach tuan dung schema."""
+
+
+def _naive_utc(value: Any) -> datetime:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        return datetime.utcnow()
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _plan_start(meta: dict, created_at: datetime) -> datetime:
+    # Ke hoach bat dau tu ngay sau ngay sinh (giong utils/rule_planner cua planner_agent)
+    fallback = datetime(created_at.year, created_at.month, created_at.day) + timedelta(days=1)
+    match = _DAY_MONTH.search(str(meta.get("start_date_label") or ""))
+    if not match:
+        return fallback
+
+    day, month, year = match.groups()
+    try:
+        start = datetime(int(year) if year else fallback.year, int(month), int(day))
+    except ValueError:
+        return fallback
+    # Nhan chi co dd/mm: ke hoach sinh cuoi thang 12 bat dau vao thang 1 nam sau
+    if not year and start < fallback - timedelta(days=180):
+        start = start.replace(year=start.year + 1)
+    return start
+
+
+def _amount(value: Any) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return max(float(value), 0.0)
+
+
+def ai_plan_node_rows(plan_id: UUID, task_id: str, plan: Any, created_at: datetime) -> list[dict]:
+    """
+    Chuyen ke hoach tuan (schema SYSTEM_INSTRUCTION.md cua planner_agent) thanh cac dong PlanNode:
+    mot MILESTONE cho ca tuan, mot ACTION cho moi ngay va mot ACTION con cho moi khoan chi.
+    """
+    data = plan.get("data") if isinstance(plan, dict) else None
+    schedule = data.get("daily_schedule") if isinstance(data, dict) else None
+    if not isinstance(schedule, list) or not schedule:
+        raise InvalidAIPlanError("Planner result is not a weekly plan")
+
+    meta = data.get("meta") or {}
+    overview = data.get("overview") or {}
+    start = _plan_start(meta, created_at)
+    now = datetime.utcnow()
+    rows: list[dict] = []
+
+    def add(parent_id, title, node_type, amount, deadline, metadata) -> UUID:
+        # created_at tang dan theo thu tu lich: cac route doc (ORDER BY created_at) giu dung thu tu
+        row = {
+            "id": uuid4(),
+            "plan_id": plan_id,
+            "parent_node_id": parent_id,
+            "title": str(title)[:255],
+            "node_type": node_type,
+            "target_amount": _amount(amount),
+            "current_amount": 0.0,
+            "status": NodeStatus.PENDING.value,
+            "node_metadata": metadata,
+            "deadline": deadline,
+            "created_at": now + timedelta(microseconds=len(rows)),
+        }
+        rows.append(row)
+        return row["id"]
+
+    week_id = add(
+        None,
+        f"Ke hoach tuan {start:%d/%m} - {start + timedelta(days=6):%d/%m}",
+        NodeType.MILESTONE.value,
+        overview.get("total_income_weekly"),
+        start + timedelta(days=6),
+        {"source": AI_PLAN_SOURCE, "task_id": task_id, "meta": meta, "overview": overview},
+    )
+
+    days = [day for day in schedule if isinstance(day, dict)]
+    for position, day in enumerate(sorted(days, key=lambda d: d.get("day_index") or 0), start=1):
+        day_index = day.get("day_index") or position
+        day_date = start + timedelta(days=day_index - 1)
+        day_id = add(
+            week_id,
+            day.get("weekday_label") or f"Ngay {day_index}",
+            NodeType.ACTION.value,
+            day.get("daily_total_planned"),
+            day_date,
+            {"day_index": day_index, "is_start_of_plan": bool(day.get("is_start_of_plan"))},
+        )
+        for activity in day.get("activities") or []:
+            if not isinstance(activity, dict):
+                continue
+            add(
+                day_id,
+                activity.get("label") or "",
+                NodeType.ACTION.value,
+                activity.get("amount"),
+                day_date,
+                {"category_id": activity.get("category_id"), "type": activity.get("type")},
+            )
+
+    return rows
+
+
+def _plan_nodes(session: Session, plan_id: UUID) -> list[PlanNode]:
+    return session.exec(
+        select(PlanNode).where(PlanNode.plan_id == plan_id).order_by(PlanNode.created_at)
+    ).all()
+
+
+def find_ingested_plan(session: Session, user_id: UUID, task_id: str) -> Optional[FinancialPlan]:
+    """Plan da nhap tu task ``task_id`` cua planner_agent (tim theo node goc)."""
+    return session.exec(
+        select(FinancialPlan)
+        .join(PlanNode, PlanNode.plan_id == FinancialPlan.id)
+        .where(FinancialPlan.user_id == user_id)
+        .where(PlanNode.parent_node_id.is_(None))
+        .where(PlanNode.node_metadata["task_id"].as_string() == task_id)
+        .limit(1)
+    ).first()
+
+
+def ingest_ai_plan(
+    session: Session, user_id: UUID, task_id: str, result: dict
+) -> tuple[FinancialPlan, list[PlanNode], bool]:
+    """
+    Nhap ke hoach da COMPLETED cua planner_agent thanh mot FinancialPlan + cac PlanNode.
+
+    Tat ca node duoc ghi bang mot lenh INSERT nhieu dong (RETURNING). Goi lai voi cung task
+    tra ve plan da nhap truoc do. Tra ve ``(plan, nodes, created)``.
+    """
+    plan = FinancialPlan(user_id=user_id, name="Ke hoach tuan (AI)")
+    rows = ai_plan_node_rows(plan.id, task_id, result.get("data"), _naive_utc(result.get("created_at")))
+
+    # Khoa theo task_id toi het transaction: hai request nhap dong thoi khong tao hai plan
+    session.connection().execute(select(func.pg_advisory_xact_lock(func.hashtext(task_id))))
+
+    existing = find_ingested_plan(session, user_id, task_id)
+    if existing:
+        nodes = _plan_nodes(session, existing.id)
+        session.commit()
+        return existing, nodes, False
+
+    session.add(plan)
+    session.flush()
+    # RETURNING cua insert nhieu dong khong dam bao thu tu: yeu cau tra theo thu tu rows (thu tu lich)
+    nodes = session.scalars(insert(PlanNode).returning(PlanNode, sort_by_parameter_order=True), rows).all()
+    session.commit()
+    return plan, nodes, True
+
+
+def _payload_statement(user_id: UUID, since: datetime):
+    # Tong thu / chi phat sinh cua cac giao dich gan day: mot dong duy nhat (aggregate khong GROUP BY)
+    totals = (
+        select(
+            func.sum(Transaction.amount)
+            .filter(Transaction.type == TransactionType.INCOME.value)
+            .label("income"),
+            func.sum(Transaction.amount)
+            .filter(Transaction.type == TransactionType.EXPENSE.value)
+            .filter(Transaction.category.not_in(_NON_DISCRETIONARY))
+            .label("spending"),
+        )
+        .where(Transaction.user_id == user_id)
+        .where(Transaction.transaction_date >= since)
+        .subquery()
+    )
+    return (
+        select(User.username, Profile, totals.c.income, totals.c.spending)
+        .select_from(User)
+        .join(Profile, Profile.user_id == User.id)
+        .join(totals, true())
+        .where(User.id == user_id)
+    )
+
+
+def build_planner_payload(session: Session, user_id: UUID) -> Optional[dict[str, Any]]:
+    """
+    Dung input cua ``POST /api/finance/generate-plan`` (planner_agent) tu Profile va giao dich
+    ``RECENT_TRANSACTION_DAYS`` ngay gan nhat, trong mot cau truy van. ``None`` neu chua co profile.
+    """
+    now = datetime.utcnow()
+    row = session.exec(
+        _payload_statement(user_id, now - timedelta(days=RECENT_TRANSACTION_DAYS))
+    ).first()
+    if row is None:
+        return None
+
+    username, profile, recent_income, recent_spending = row
+    income = (profile.monthly_income or 0) + (profile.other_income or 0)
+    if not income:
+        # Chua khai bao luong: dung tong thu nhap ghi nhan trong cac giao dich gan day
+        income = recent_income or 0
+
+    return {
+        "user_id": str(user_id),
+        "ho_ten": username,
+        "gioi_tinh": profile.gender,
+        "tuoi_tac": profile.age,
+        "nghe_nghiep": profile.occupation,
+        "current_day": f"{_WEEKDAYS[now.weekday()]}, {now:%d/%m/%Y}",
+        "thu_nhap_hang_thang": income,
+        "no": bool(profile.current_debt),
+        "tong_no": profile.current_debt or 0,
+        "chi_tieu_phat_sinh": recent_spending or 0,
+        "chi_tieu_bat_buoc": [
+            {
+                "ten_chi_tieu": expense.get("name") or "",
+                "uoc_tinh": expense.get("amount") or 0,
+                "tan_suat": "Tháng",
+                "note": expense.get("description") or expense.get("category") or "",
+            }
+            for expense in profile.fixed_expenses or []
+            if isinstance(expense, dict)
+        ],
+        "muc_tieu": "; ".join(str(goal) for goal in profile.goals or [] if goal) or None,
+    }
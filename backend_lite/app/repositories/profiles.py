@@ -0,0 +1,171 @@
+from datetime import datetime
+from typing import Any, Optional
+from uuid import UUID, uuid4
+
+from sqlalchemy import JSON, case, cast, func, literal, union_all, update
+from sqlalchemy.dialects.postgresql import JSONB, aggregate_order_by, insert
+from sqlmodel import Session, select
+
+from app.models.users import Profile, ProfileUpdate, FixedExpenseCreate
+
+_EXECUTION_OPTIONS = {"populate_existing": True}
+
+
+def default_profile_values(user_id: Any) -> dict[str, Any]:
+    """Column values of an empty profile, for statements that bypass the ORM."""
+    # Core INSERT khong chay default_factory cua cac cot sa_column (JSON),
+    # nen khai bao day du gia tri mac dinh o day.
+    return {
+        "id": uuid4(),
+        "user_id": user_id,
+        "dependents": 0,
+        "current_savings": 0,
+        "fixed_expenses": [],
+        "goals": [],
+        "created_at": datetime.utcnow(),
+    }
+
+
+def _normalize_fixed_expenses(expenses: Optional[list[FixedExpenseCreate]]) -> list[dict]:
+    if not expenses:
+        return []
+
+    normalized = []
+    for expense in expenses:
+        payload = expense.model_dump()
+        payload["id"] = payload.get("id") or str(uuid4())
+        normalized.append(payload)
+    return normalized
+
+
+def _upsert(session: Session, user_id: UUID, changes: dict[str, Any]) -> Profile:
+    statement = insert(Profile).values(**{**default_profile_values(user_id), **changes})
+    statement = statement.on_conflict_do_update(
+        index_elements=[Profile.user_id],
+        set_=changes,
+    ).returning(Profile)
+
+    profile = session.scalars(statement, execution_options=_EXECUTION_OPTIONS).one()
+    session.commit()
+    return profile
+
+
+def _ensure_statement(user_id: UUID):
+    # WITH ins AS (INSERT ... ON CONFLICT DO NOTHING RETURNING *)
+    # SELECT * FROM ins UNION ALL SELECT * FROM profiles WHERE user_id = ... LIMIT 1
+    # Dong da co chi duoc doc, khong ghi lai (khong tao row version / WAL moi)
+    inserted = (
+        insert(Profile.__table__)
+        .values(**default_profile_values(user_id))
+        .on_conflict_do_nothing(index_elements=[Profile.__table__.c.user_id])
+        .returning(*Profile.__table__.c)
+        .cte("ins")
+    )
+    existing = select(Profile.__table__).where(Profile.__table__.c.user_id == user_id)
+    return select(Profile).from_statement(union_all(select(inserted), existing).limit(1))
+
+
+def _fixed_expense_elements():
+    # jsonb_array_elements(fixed_expenses) WITH ORDINALITY, tuong quan voi dong profile dang UPDATE
+    return (
+        func.jsonb_array_elements(cast(Profile.fixed_expenses, JSONB))
+        .table_valued("value", with_ordinality="position")
+        .render_derived(name="expense")
+    )
+
+
+def _has_fixed_expense(expense_id: str):
+    return cast(Profile.fixed_expenses, JSONB).op("@>", return_type=JSONB)(
+        literal([{"id": expense_id}], JSONB)
+    )
+
+
+def _update_fixed_expenses(session: Session, user_id: UUID, expenses: Any, *conditions) -> Optional[Profile]:
+    statement = (
+        update(Profile)
+        .where(Profile.user_id == user_id, *conditions)
+        .values(fixed_expenses=expenses, updated_at=datetime.utcnow())
+        .returning(Profile)
+    )
+    profile = session.scalars(
+        statement,
+        execution_options={**_EXECUTION_OPTIONS, "synchronize_session": False},
+    ).first()
+    session.commit()
+    return profile
+
+
+def get_profile(session: Session, user_id: UUID) -> Optional[Profile]:
+    """Load the profile of a user, if any."""
+    return session.exec(select(Profile).where(Profile.user_id == user_id)).first()
+
+
+def ensure_profile(session: Session, user_id: UUID) -> Profile:
+    """Return the profile of a user, creating an empty one on first access."""
+    statement = _ensure_statement(user_id)
+    profile = session.scalars(statement, execution_options=_EXECUTION_OPTIONS).first()
+    if profile is None:
+        # Request khac vua tao profile sau snapshot cua cau lenh (xung dot nhung chua thay dong): doc lai
+        profile = session.scalars(statement, execution_options=_EXECUTION_OPTIONS).one()
+    session.commit()
+    return profile
+
+
+def upsert_profile(session: Session, user_id: UUID, profile_data: ProfileUpdate) -> Profile:
+    """Apply the fields set on ``profile_data``, creating the profile if needed."""
+    changes = {
+        key: value
+        for key, value in profile_data.model_dump(exclude_unset=True).items()
+        if value is not None
+    }
+    if "fixed_expenses" in changes:
+        changes["fixed_expenses"] = _normalize_fixed_expenses(profile_data.fixed_expenses)
+    changes["updated_at"] = datetime.utcnow()
+    return _upsert(session, user_id, changes)
+
+
+def append_fixed_expense(session: Session, user_id: UUID, expense: dict) -> Optional[Profile]:
+    """Append one fixed expense in place, without reading the current list."""
+    current = func.coalesce(cast(Profile.fixed_expenses, JSONB), literal([], JSONB))
+    appended = current.op("||", return_type=JSONB)(literal([expense], JSONB))
+    return _update_fixed_expenses(session, user_id, cast(appended, JSON))
+
+
+def update_fixed_expense(
+    session: Session, user_id: UUID, expense_id: str, changes: dict[str, Any]
+) -> Optional[dict]:
+    """
+    Merge ``changes`` into one fixed expense with a single ``UPDATE``.
+
+    The list is rebuilt in SQL from the row being updated, so expenses appended
+    concurrently are kept. Returns the updated expense, ``None`` if the user has
+    no such expense.
+    """
+    expense = _fixed_expense_elements()
+    edited = case(
+        (expense.c.value.op("->>")("id") == expense_id,
+         expense.c.value.op("||", return_type=JSONB)(literal(changes, JSONB))),
+        else_=expense.c.value,
+    )
+    expenses = select(func.jsonb_agg(aggregate_order_by(edited, expense.c.position))).scalar_subquery()
+    profile = _update_fixed_expenses(
+        session, user_id, cast(expenses, JSON), _has_fixed_expense(expense_id)
+    )
+    if profile is None:
+        return None
+    return next(item for item in profile.fixed_expenses if item.get("id") == expense_id)
+
+
+def delete_fixed_expense(session: Session, user_id: UUID, expense_id: str) -> bool:
+    """Remove one fixed expense with a single ``UPDATE``; ``False`` if it does not exist."""
+    expense = _fixed_expense_elements()
+    remaining = (
+        select(func.jsonb_agg(aggregate_order_by(expense.c.value, expense.c.position)))
+        .where(expense.c.value.op("->>")("id").is_distinct_from(expense_id))
+        .scalar_subquery()
+    )
+    expenses = func.coalesce(remaining, literal([], JSONB))
+    profile = _update_fixed_expenses(
+        session, user_id, cast(expenses, JSON), _has_fixed_expense(expense_id)
+    )
+    return profile is not None
@@ -0,0 +1,159 @@
+from datetime import datetime
+from typing import Any, Iterator, Optional
+from uuid import UUID
+
+from sqlalchemy import insert, literal, or_, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+
+from app.models.auth import UserCreate, UserResponse
+from app.models.users import User, Profile
+from app.repositories.profiles import default_profile_values
+
+
+# Cac truong duoc phep tra ra khi liet ke user (khong bao gio gom hashed_password)
+USER_FIELDS = tuple(UserResponse.model_fields)
+
+_STREAM_BATCH_SIZE = 1000
+
+
+class DuplicateUserError(Exception):
+    """Raised when a unique user column (``email`` or ``username``) is already taken."""
+
+    def __init__(self, field: str):
+        super().__init__(f"Duplicate value for users.{field}")
+        self.field = field
+
+
+# Ten unique index cua users.email / users.username (ix_users_email, ix_users_username) ->
+# ten truong; kem ten mac dinh cua Postgres neu bang duoc tao bang UNIQUE constraint
+_UNIQUE_USER_CONSTRAINTS = {
+    **{f"users_{field}_key": field for field in ("email", "username")},
+    **{
+        index.name: column.name
+        for index in User.__table__.indexes
+        if index.unique
+        for column in index.columns
+        if column.name in ("email", "username")
+    },
+}
+
+
+def _duplicate_field(exc: IntegrityError) -> Optional[str]:
+    """The user field whose unique constraint ``exc`` violated, or ``None`` for any other error."""
+    diag = getattr(exc.orig, "diag", None)
+    constraint = getattr(diag, "constraint_name", None)
+    if constraint:
+        return _UNIQUE_USER_CONSTRAINTS.get(constraint)
+    # Driver khong co diag: tim ten constraint trong thong bao loi
+    message = str(exc.orig)
+    for name, field in _UNIQUE_USER_CONSTRAINTS.items():
+        if name in message:
+            return field
+    return None
+
+
+def create_user_with_profile(session: Session, user_in: UserCreate, hashed_password: str) -> User:
+    """
+    Insert a user and its default profile in a single statement.
+
+    Uniqueness of email/username is left to the database constraints; a
+    violation is surfaced as ``DuplicateUserError``.
+    """
+    db_user = User.model_validate(user_in, update={"hashed_password": hashed_password})
+
+    # WITH new_user AS (INSERT INTO users ... RETURNING id)
+    # INSERT INTO profiles (...) SELECT ..., new_user.id FROM new_user
+    new_user = (
+        insert(User.__table__)
+        .values(**db_user.model_dump())
+        .returning(User.__table__.c.id)
+        .cte("new_user")
+    )
+    profile_columns = Profile.__table__.c
+    profile_values = default_profile_values(None)
+    row = [
+        new_user.c.id if name == "user_id" else literal(value, profile_columns[name].type)
+        for name, value in profile_values.items()
+    ]
+    statement = insert(Profile.__table__).from_select(
+        list(profile_values),
+        select(*row).select_from(new_user),
+    )
+
+    try:
+        session.connection().execute(statement)
+        session.commit()
+    except IntegrityError as exc:
+        session.rollback()
+        field = _duplicate_field(exc)
+        # FK, NOT NULL, CHECK... khong phai trung email/username: de loi goc noi len
+        if field is None:
+            raise
+        raise DuplicateUserError(field) from exc
+
+    return db_user
+
+
+def _listing_statement(
+    fields: list[str],
+    search: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+):
+    # Luon lay created_at + id de dung lam khoa phan trang
+    names = list(dict.fromkeys([*fields, "created_at", "id"]))
+    columns = User.__table__.c
+    statement = select(*(columns[name] for name in names))
+
+    if search:
+        # Tim theo tien to: % va _ trong chuoi tim kiem la ky tu thuong, khong phai wildcard
+        escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        pattern = f"{escaped}%"
+        statement = statement.where(
+            or_(columns.username.ilike(pattern, escape="\\"), columns.email.ilike(pattern, escape="\\"))
+        )
+    if created_after:
+        statement = statement.where(columns.created_at >= created_after)
+    if created_before:
+        statement = statement.where(columns.created_at <= created_before)
+
+    return statement.order_by(columns.created_at, columns.id)
+
+
+def list_users(
+    session: Session,
+    fields: list[str],
+    limit: int,
+    after: Optional[tuple[datetime, UUID]] = None,
+    **filters: Any,
+) -> tuple[list[dict[str, Any]], Optional[tuple[datetime, UUID]]]:
+    """
+    Return one keyset page of users projected on ``fields``.
+
+    The second element is the ``(created_at, id)`` key of the last row when
+    more rows follow, otherwise ``None``.
+    """
+    statement = _listing_statement(fields, **filters)
+    if after:
+        columns = User.__table__.c
+        statement = statement.where(tuple_(columns.created_at, columns.id) > tuple_(*after))
+
+    rows = session.connection().execute(statement.limit(limit + 1)).mappings().all()
+
+    next_key = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_key = (rows[-1]["created_at"], rows[-1]["id"])
+    return [{name: row[name] for name in fields} for row in rows], next_key
+
+
+def iter_users(session: Session, fields: list[str], **filters: Any) -> Iterator[dict[str, Any]]:
+    """Yield every matching user from a server-side cursor, ``_STREAM_BATCH_SIZE`` rows at a time."""
+    connection = session.connection().execution_options(
+        stream_results=True,
+        yield_per=_STREAM_BATCH_SIZE,
+    )
+    result = connection.execute(_listing_statement(fields, **filters))
+    for row in result.mappings():
+        yield {name: row[name] for name in fields}
@@ -0,0 +1,28 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any
+from uuid import UUID
+
+
+def encode_cursor(created_at: datetime, row_id: UUID) -> str:
+    """Encode a ``(created_at, id)`` keyset position as an opaque cursor."""
+    raw = json.dumps([created_at.isoformat(), str(row_id)])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """Decode a cursor built by ``encode_cursor``; raises ``ValueError`` if malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), UUID(row_id)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def json_default(value: Any) -> str:
+    """``json.dumps`` fallback for the UUID/datetime values returned by the DB."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
@@ -0,0 +1,84 @@
+from typing import Any, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.log import request_id_var
+
+# Mot client dung chung cho ca process: giu ket noi keep-alive toi planner_agent thay vi
+# mo TCP moi o moi request. Routes la ham sync (chay trong threadpool), httpx.Client an toan
+# khi dung tu nhieu thread.
+_client: Optional[httpx.Client] = None
+
+
+class PlannerServiceError(Exception):
+    """planner_agent khong truy cap duoc hoac tra ve loi khong mong doi."""
+
+
+class PlannerRejectedError(PlannerServiceError):
+    """planner_agent tu choi nhan task (429 vuot gioi han, 503 hang doi day)."""
+
+    def __init__(self, status_code: int, detail: Any, retry_after: Optional[str]):
+        super().__init__(f"Planner service rejected the request ({status_code})")
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+def _headers() -> dict[str, str]:
+    # Chuyen tiep request id de log cua backend va planner_agent ghep lai duoc
+    request_id = request_id_var.get()
+    return {"X-Request-ID": request_id} if request_id else {}
+
+
+def get_client() -> httpx.Client:
+    global _client
+    if _client is None:
+        _client = httpx.Client(
+            base_url=settings.PLANNER_AGENT_URL,
+            timeout=settings.PLANNER_AGENT_TIMEOUT_S,
+            limits=httpx.Limits(
+                max_connections=settings.PLANNER_AGENT_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.PLANNER_AGENT_MAX_CONNECTIONS,
+            ),
+        )
+    return _client
+
+
+def close_client() -> None:
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+def fetch_task_result(task_id: str) -> Optional[dict[str, Any]]:
+    """Ket qua task tu ``GET /api/finance/result/{task_id}``; ``None`` neu task khong ton tai."""
+    try:
+        response = get_client().get(f"/api/finance/result/{task_id}", headers=_headers())
+    except httpx.HTTPError as exc:
+        raise PlannerServiceError(f"Planner service unavailable: {exc}") from exc
+
+    if response.status_code == 404:
+        return None
+    if response.status_code != 200:
+        raise PlannerServiceError(f"Planner service returned {response.status_code}")
+    return response.json()
+
+
+def submit_plan(payload: dict[str, Any]) -> dict[str, Any]:
+    """Tao task qua ``POST /api/finance/generate-plan``; tra ve task_id, poll_url, provisional."""
+    try:
+        response = get_client().post("/api/finance/generate-plan", json=payload, headers=_headers())
+    except httpx.HTTPError as exc:
+        raise PlannerServiceError(f"Planner service unavailable: {exc}") from exc
+
+    if response.status_code in (429, 503):
+        raise PlannerRejectedError(
+            response.status_code,
+            response.json().get("detail"),
+            response.headers.get("Retry-After"),
+        )
+    if response.status_code != 200:
+        raise PlannerServiceError(f"Planner service returned {response.status_code}")
+    return response.json()
@@ -0,0 +1,68 @@
+from collections import defaultdict
+from operator import attrgetter
+from typing import Any, Iterable, Sequence
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from app.models.transactions import TransactionResponse
+from app.models.financial_plans import PlanResponse, PlanNodeResponse
+
+# Routes tra ve truc tiep Response nen FastAPI bo qua buoc validate lai theo response_model
+# (response_model chi con dung cho OpenAPI). Danh sach truong duoc tinh san tu schema, moi dong
+# ORM chi duoc doc mot lan; ca body duoc validate mot lan bang TypeAdapter (khong phai tung dong)
+# roi serialise bang pydantic-core, nen du lieu sai schema (VD: node_metadata nhap tu
+# planner_agent) loi o day thay vi lot ra client, nhu nhau tren moi route.
+TRANSACTION_FIELDS = tuple(TransactionResponse.model_fields)
+PLAN_FIELDS = tuple(name for name in PlanResponse.model_fields if name != "nodes")
+PLAN_NODE_FIELDS = tuple(PlanNodeResponse.model_fields)
+
+_transaction_getter = attrgetter(*TRANSACTION_FIELDS)
+_plan_getter = attrgetter(*PLAN_FIELDS)
+_plan_node_getter = attrgetter(*PLAN_NODE_FIELDS)
+
+_transaction_list_adapter = TypeAdapter(list[TransactionResponse])
+_plan_adapter = TypeAdapter(PlanResponse)
+_plan_list_adapter = TypeAdapter(list[PlanResponse])
+
+
+def _validated_response(adapter: TypeAdapter, payload: Any, status_code: int = 200) -> Response:
+    body = adapter.dump_json(adapter.validate_python(payload))
+    return Response(body, status_code=status_code, media_type="application/json")
+
+
+def transactions_payload(transactions: Iterable[Any]) -> list[dict]:
+    return [dict(zip(TRANSACTION_FIELDS, _transaction_getter(row))) for row in transactions]
+
+
+def plan_nodes_payload(nodes: Iterable[Any]) -> list[dict]:
+    return [dict(zip(PLAN_NODE_FIELDS, _plan_node_getter(node))) for node in nodes]
+
+
+def plan_payload(plan: Any, nodes: Iterable[Any]) -> dict:
+    payload = dict(zip(PLAN_FIELDS, _plan_getter(plan)))
+    payload["nodes"] = plan_nodes_payload(nodes)
+    return payload
+
+
+def transaction_list_response(transactions: Iterable[Any]) -> Response:
+    """Validate transaction rows once as ``list[TransactionResponse]`` and serialise the body."""
+    return _validated_response(_transaction_list_adapter, transactions_payload(transactions))
+
+
+def plan_response(plan: Any, nodes: Iterable[Any], status_code: int = 200) -> Response:
+    """Validate a plan and its nodes once as ``PlanResponse`` and serialise the body."""
+    return _validated_response(_plan_adapter, plan_payload(plan, nodes), status_code=status_code)
+
+
+def group_nodes(plans: Sequence[Any], nodes: Iterable[Any]) -> list[tuple[Any, list[Any]]]:
+    """Pair each plan with its nodes from one ``plan_id IN (...)`` result, keeping node order."""
+    by_plan: dict[Any, list[Any]] = defaultdict(list)
+    for node in nodes:
+        by_plan[node.plan_id].append(node)
+    return [(plan, by_plan.get(plan.id, [])) for plan in plans]
+
+
+def plan_list_response(plans: Sequence[tuple[Any, Iterable[Any]]]) -> Response:
+    """Validate ``(plan, nodes)`` pairs once as ``list[PlanResponse]`` and serialise the body."""
+    return _validated_response(_plan_list_adapter, [plan_payload(plan, nodes) for plan, nodes in plans])
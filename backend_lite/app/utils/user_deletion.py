@@ -0,0 +1,204 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import delete, func, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.db import engine
+from app.models.users import User, Profile, UserDeletionJob, DeletionJobStatus
+from app.models.transactions import Transaction
+from app.models.financial_plans import FinancialPlan, PlanNode
+from app.models.rewards import DailyCheckIn, UserReward
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = (DeletionJobStatus.PENDING.value, DeletionJobStatus.RUNNING.value)
+_ACTIVE_JOB_INDEX = "uq_user_deletion_jobs_active"
+
+
+def _dependent_tables(user_id: UUID) -> list[tuple]:
+    """(ten bang, model, dieu kien loc, thu tu xoa) theo thu tu xoa an toan voi foreign key."""
+    plan_ids = select(FinancialPlan.id).where(FinancialPlan.user_id == user_id)
+    return [
+        # Node con luon duoc tao sau node cha -> xoa tu moi nhat de khong vuong parent_node_id
+        ("plan_nodes", PlanNode, PlanNode.plan_id.in_(plan_ids), PlanNode.created_at.desc()),
+        ("financial_plans", FinancialPlan, FinancialPlan.user_id == user_id, None),
+        ("transactions", Transaction, Transaction.user_id == user_id, None),
+        ("daily_check_ins", DailyCheckIn, DailyCheckIn.user_id == user_id, None),
+        ("user_rewards", UserReward, UserReward.user_id == user_id, None),
+        ("profiles", Profile, Profile.user_id == user_id, None),
+        ("users", User, User.id == user_id, None),
+    ]
+
+
+def _delete_batch(session: Session, model, condition, order_by, batch_size: int) -> int:
+    batch_ids = select(model.id).where(condition)
+    if order_by is not None:
+        batch_ids = batch_ids.order_by(order_by)
+    batch_ids = batch_ids.limit(batch_size)
+
+    result = session.connection().execute(
+        delete(model.__table__).where(model.__table__.c.id.in_(batch_ids.scalar_subquery()))
+    )
+    return result.rowcount
+
+
+def _active_job_index():
+    return next(index for index in UserDeletionJob.__table__.indexes if index.name == _ACTIVE_JOB_INDEX)
+
+
+def find_active_job(session: Session, user_id: UUID) -> Optional[UserDeletionJob]:
+    """Return the pending or running deletion job of a user, if any."""
+    return session.exec(
+        select(UserDeletionJob)
+        .where(UserDeletionJob.user_id == user_id)
+        .where(UserDeletionJob.status.in_(ACTIVE_STATUSES))
+    ).first()
+
+
+def create_deletion_job(session: Session, user_id: UUID) -> tuple[UserDeletionJob, bool]:
+    """
+    Insert a pending job unless the user already has an active one.
+
+    ``INSERT ... ON CONFLICT DO NOTHING`` on the partial unique index keeps
+    concurrent requests from starting two jobs. Returns ``(job, created)``.
+    """
+    table = UserDeletionJob.__table__
+    values = UserDeletionJob(user_id=user_id).model_dump()
+    statement = (
+        insert(table)
+        .values(**values)
+        .on_conflict_do_nothing(
+            index_elements=[table.c.user_id],
+            index_where=_active_job_index().dialect_options["postgresql"]["where"],
+        )
+        .returning(table.c.id)
+    )
+    inserted = session.connection().execute(statement).first()
+    session.commit()
+    if inserted:
+        return session.get(UserDeletionJob, inserted.id), True
+    return find_active_job(session, user_id), False
+
+
+def claim_stale_job(session: Session, job_id: UUID) -> bool:
+    """
+    Take over an active job whose worker stopped updating it (restart, --reload).
+
+    The conditional ``UPDATE`` bumps ``updated_at``, so only one caller wins
+    a given stale job.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.USER_DELETION_STALE_S)
+    claimed = session.connection().execute(
+        update(UserDeletionJob.__table__)
+        .where(UserDeletionJob.id == job_id)
+        .where(UserDeletionJob.status.in_(ACTIVE_STATUSES))
+        .where(func.coalesce(UserDeletionJob.updated_at, UserDeletionJob.created_at) < cutoff)
+        .values(updated_at=datetime.utcnow())
+    ).rowcount
+    session.commit()
+    return bool(claimed)
+
+
+def resume_stale_jobs() -> int:
+    """Re-run every stale active job in this thread; returns how many were resumed."""
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.USER_DELETION_STALE_S)
+    with Session(engine) as session:
+        job_ids = session.exec(
+            select(UserDeletionJob.id)
+            .where(UserDeletionJob.status.in_(ACTIVE_STATUSES))
+            .where(func.coalesce(UserDeletionJob.updated_at, UserDeletionJob.created_at) < cutoff)
+        ).all()
+        claimed = [job_id for job_id in job_ids if claim_stale_job(session, job_id)]
+
+    for job_id in claimed:
+        logger.warning("Resuming stale user deletion job", extra={"job_id": str(job_id)})
+        run_user_deletion(job_id)
+    return len(claimed)
+
+
+def ensure_active_job_index() -> None:
+    """
+    Create the one-active-job-per-user index on tables created before it existed.
+
+    Duplicate active jobs left by the old find-then-insert race are failed first
+    (the newest one per user is kept), otherwise the unique index cannot be built.
+    """
+    table = UserDeletionJob.__table__
+    newest = (
+        select(table.c.id)
+        .where(table.c.status.in_(ACTIVE_STATUSES))
+        .distinct(table.c.user_id)
+        .order_by(table.c.user_id, table.c.created_at.desc())
+    )
+    with engine.begin() as connection:
+        connection.execute(
+            update(table)
+            .where(table.c.status.in_(ACTIVE_STATUSES))
+            .where(table.c.id.not_in(newest))
+            .values(
+                status=DeletionJobStatus.FAILED.value,
+                error_message="Superseded by another deletion job of the same user",
+                finished_at=datetime.utcnow(),
+            )
+        )
+        _active_job_index().create(connection, checkfirst=True)
+
+
+def run_user_deletion(job_id: UUID, batch_size: Optional[int] = None) -> None:
+    """
+    Delete a user and its dependent rows, ``batch_size`` rows per transaction.
+
+    Meant to run outside the request (BackgroundTasks); progress is committed
+    to the job row after every batch. Safe to re-run on a job interrupted
+    midway: only the rows still present are counted and deleted.
+    """
+    batch_size = batch_size or settings.USER_DELETION_BATCH_SIZE
+
+    with Session(engine, expire_on_commit=False) as session:
+        job = session.get(UserDeletionJob, job_id)
+        if not job:
+            return
+
+        tables = _dependent_tables(job.user_id)
+        try:
+            job.status = DeletionJobStatus.RUNNING.value
+            job.total_rows = job.deleted_rows + sum(
+                session.connection().execute(
+                    select(func.count()).select_from(model).where(condition)
+                ).scalar_one()
+                for _, model, condition, _ in tables
+            )
+            job.updated_at = datetime.utcnow()
+            session.add(job)
+            session.commit()
+
+            for name, model, condition, order_by in tables:
+                while True:
+                    deleted = _delete_batch(session, model, condition, order_by, batch_size)
+                    if deleted:
+                        job.deleted_rows += deleted
+                        job.deleted_by_table = {
+                            **job.deleted_by_table,
+                            name: job.deleted_by_table.get(name, 0) + deleted,
+                        }
+                        job.updated_at = datetime.utcnow()
+                        session.add(job)
+                    session.commit()
+                    if deleted < batch_size:
+                        break
+
+            job.status = DeletionJobStatus.COMPLETED.value
+        except Exception as exc:
+            session.rollback()
+            job.status = DeletionJobStatus.FAILED.value
+            job.error_message = str(exc)[:1000]
+
+        job.updated_at = datetime.utcnow()
+        job.finished_at = job.updated_at
+        session.add(job)
+        session.commit()
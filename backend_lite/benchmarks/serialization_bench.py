@@ -0,0 +1,91 @@
+"""
+So sanh toc do serialize mot trang 500 transaction: duong cu (response_model validate
+tung dong) va duong moi (app.utils.serializers: validate ca body mot lan + pydantic-core).
+
+Chay tu thu muc backend_lite:
+    python -m benchmarks.serialization_bench [--rows 500] [--requests 300]
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import List
+from uuid import uuid4
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.models.transactions import Transaction, TransactionResponse
+from app.utils.serializers import transaction_list_response
+
+
+def _make_rows(count: int) -> list[Transaction]:
+    user_id = uuid4()
+    now = datetime.utcnow()
+    return [
+        Transaction(
+            user_id=user_id,
+            amount=10000 + i,
+            category="FOOD",
+            type="EXPENSE",
+            transaction_date=now - timedelta(minutes=i),
+            description=f"Giao dich {i}",
+        )
+        for i in range(count)
+    ]
+
+
+def _build_app(rows: list[Transaction]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/before", response_model=List[TransactionResponse])
+    def before():
+        return rows
+
+    @app.get("/after", response_model=List[TransactionResponse])
+    def after():
+        return transaction_list_response(rows)
+
+    return app
+
+
+def _requests_per_second(client: TestClient, path: str, requests: int) -> float:
+    client.get(path)  # warm up
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get(path)
+    return requests / (time.perf_counter() - started)
+
+
+def _allocations(client: TestClient, path: str) -> tuple[int, int]:
+    client.get(path)
+    tracemalloc.start()
+    client.get(path)
+    snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count for stat in snapshot.statistics("filename"))
+    return blocks, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    client = TestClient(_build_app(_make_rows(args.rows)))
+    before_body = client.get("/before").json()
+    after_body = client.get("/after").json()
+    assert len(before_body) == len(after_body) == args.rows
+    assert before_body[0]["id"] == after_body[0]["id"]
+
+    print(f"{'path':<8}{'req/s':>10}{'live blocks':>14}{'peak KiB':>12}")
+    for path in ("/before", "/after"):
+        rps = _requests_per_second(client, path, args.requests)
+        blocks, peak = _allocations(client, path)
+        print(f"{path:<8}{rps:>10.1f}{blocks:>14}{peak / 1024:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Đo thời gian khởi động: chạy `python -X importtime -c "import <module>"` trong process mới
+(nhiều lần, lấy trung vị) và in thời gian import theo từng module/package.
+
+Từ thư mục planner_agent:
+    python -m benchmarks.import_time_bench [--module main] [--runs 5] [--top 15]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _import_times(module: str) -> list[tuple[str, int, int]]:
+    """[(module, self_us, cumulative_us)] theo thứ tự import."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=_ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(result.stderr.strip().splitlines()[-1])
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    totals = []
+    by_module = defaultdict(list)
+    by_package = defaultdict(list)
+    for _ in range(args.runs):
+        rows = _import_times(args.module)
+        totals.append(next(cumulative for name, _, cumulative in rows if name == args.module))
+        packages = defaultdict(int)
+        for name, self_us, cumulative_us in rows:
+            by_module[name].append(cumulative_us)
+            packages[name.split(".")[0]] += self_us
+        for package, self_us in packages.items():
+            by_package[package].append(self_us)
+
+    print(f"import {args.module}: median {statistics.median(totals) / 1000:.1f} ms over {args.runs} runs")
+
+    print(f"\nTop {args.top} packages (self time, ms):")
+    for package, values in sorted(by_package.items(), key=lambda item: -statistics.median(item[1]))[:args.top]:
+        print(f"  {statistics.median(values) / 1000:8.1f}  {package}")
+
+    print(f"\nTop {args.top} modules (cumulative, ms):")
+    for name, values in sorted(by_module.items(), key=lambda item: -statistics.median(item[1]))[:args.top]:
+        print(f"  {statistics.median(values) / 1000:8.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark end-to-end: POST /generate-plan -> hàng đợi -> worker -> stream -> lưu DB -> /result.
+
+Chạy server với model giả để không cần mạng:
+    PLAN_MODEL_BACKEND=fake PLAN_FAKE_TOKENS_PER_S=400 PLAN_FAKE_ERROR_RATE=0.05 uvicorn main:app --port 6969
+
+Rồi từ thư mục planner_agent:
+    python -m benchmarks.pipeline_bench [--url http://localhost:6969] [--tasks 200] [--concurrency 20]
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import statistics
+import time
+
+import httpx
+
+_MOCK_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "mockData")
+
+
+def _payloads() -> list[dict]:
+    payloads = []
+    for path in sorted(glob.glob(os.path.join(_MOCK_DIR, "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            payloads.append(json.load(f))
+    return payloads
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+async def _run_task(client: httpx.AsyncClient, payload: dict, results: dict):
+    started = time.perf_counter()
+    response = await client.post("/api/finance/generate-plan", json=payload)
+    response.raise_for_status()
+    results["submit_ms"].append((time.perf_counter() - started) * 1000)
+    task_id = response.json()["task_id"]
+
+    while True:
+        result = (await client.get(f"/api/finance/result/{task_id}", params={"wait": 30})).json()
+        if result.get("status") in ("COMPLETED", "FAILED"):
+            break
+    results["total_ms"].append((time.perf_counter() - started) * 1000)
+    results[result["status"]] += 1
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:6969")
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    payloads = _payloads()
+    results = {"submit_ms": [], "total_ms": [], "COMPLETED": 0, "FAILED": 0}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def bounded(i: int):
+        # Key cache kết quả chỉ băm prompt (không có user_id): đổi họ tên theo từng task để prompt
+        # khác nhau, cache không che mất đường sinh thật
+        payload = dict(payloads[i % len(payloads)])
+        payload["user_id"] = i + 1
+        payload["ho_ten"] = f"{payload.get('ho_ten') or 'bench'} #{i + 1}"
+        async with semaphore:
+            await _run_task(client, payload, results)
+
+    started = time.perf_counter()
+    async with httpx.AsyncClient(base_url=args.url, timeout=60) as client:
+        await asyncio.gather(*(bounded(i) for i in range(args.tasks)))
+    elapsed = time.perf_counter() - started
+
+    print(f"tasks={args.tasks} concurrency={args.concurrency} elapsed={elapsed:.1f}s "
+          f"throughput={args.tasks / elapsed:.1f} task/s")
+    print(f"completed={results['COMPLETED']} failed={results['FAILED']}")
+    for name in ("submit_ms", "total_ms"):
+        values = results[name]
+        print(f"{name:10s} mean={statistics.mean(values):8.1f} p50={_percentile(values, 0.5):8.1f} "
+              f"p95={_percentile(values, 0.95):8.1f} p99={_percentile(values, 0.99):8.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,15 +1,43 @@
-from fastapi import APIRouter, BackgroundTasks, HTTPException, Body
+import json
+import logging
+
+from fastapi import APIRouter, HTTPException, Body, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
 # Import các hàm service đã viết ở bước trước
-from services.finance_agent_service import init_task_record, process_ai_background, get_task_result
+from services.admission import AdmissionRejected, admission
+from core.config import settings
+from services.finance_agent_service import (
+    init_task_record,
+    init_batch_records,
+    get_batch_progress,
+    retry_task,
+    get_task_result,
+    wait_for_task_result,
+    watch_task,
+)
+from services.plan_metrics import DEFAULT_WINDOWS, collect_metrics, parse_window
+from utils.plan_cache import plan_cache
+from utils.plan_storage import render_json
+from utils.planner import breaker
+from utils.rule_planner import provisional_plan
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/api/finance",
     tags=["Finance Agent"]
 )
 
+
+def _has_user_id(data: dict) -> bool:
+    """user_id phải là chuỗi không rỗng hoặc số nguyên: null/"" bị từ chối thay vì lưu thành "None"."""
+    user_id = data.get("user_id")
+    if isinstance(user_id, str):
+        return bool(user_id.strip())
+    return isinstance(user_id, int) and not isinstance(user_id, bool)
+
 @router.post("/generate-plan")
 async def create_financial_plan(
-    background_tasks: BackgroundTasks,
     # Sử dụng Body(..., example=...) để Swagger UI hiện ví dụ mẫu mà không cần tạo Class DTO
     user_data: dict = Body(..., example={
         "user_id": "user_123",
@@ -25,43 +53,208 @@ async def create_financial_plan(
     """
     API tạo task lập kế hoạch.
     - Input: JSON (Dict)
-    - Output: Task ID ngay lập tức (không đợi AI chạy xong)
+    - Output: Task ID ngay lập tức (không đợi AI chạy xong) + kế hoạch tạm theo quy tắc (provisional)
     """
     
     # 1. Validate cơ bản
-    if "user_id" not in user_data:
+    if not _has_user_id(user_data):
         raise HTTPException(status_code=400, detail="Missing user_id")
 
+    # Giới hạn theo user (429) và độ dài hàng chờ (503), kèm Retry-After
     try:
-        # 2. Tạo record trong DB
-        task_id = await init_task_record(user_data)
-
-        # 3. Đẩy việc cho AI chạy ngầm 
+        await admission.admit(user_data["user_id"])
+    except AdmissionRejected as e:
+        # Lúc quá tải có thể có rất nhiều request bị từ chối: chỉ log một phần
+        logger.info(
+            "Plan request rejected",
+            extra={"status_code": e.status_code, "user_id": str(user_data["user_id"]), "sample_rate": 0.1},
+        )
+        raise HTTPException(
+            status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)}
+        )
 
-        background_tasks.add_task(process_ai_background, task_id, user_data)
+    try:
+        # 2. Tạo record trong DB, exchange PENDING chính là job trong hàng đợi.
+        # Worker (services/plan_worker.py) sẽ nhận job và cho AI chạy ngầm.
+        task_id = await init_task_record(user_data)
+        logger.info("Plan task submitted", extra={"task_id": task_id})
 
-        # 4. Trả về kết quả ngay lập tức
+        # 3. Trả về kết quả ngay lập tức, kèm kế hoạch tạm theo quy tắc trong lúc AI sinh bản chi tiết
         return {
             "status": "submitted",
             "task_id": task_id,
             "message": "Hệ thống đang xử lý kế hoạch tài chính...",
-            "poll_url": f"/api/finance/result/{task_id}"
+            "poll_url": f"/api/finance/result/{task_id}",
+            "provisional": provisional_plan(user_data),
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/generate-plans/batch", status_code=202)
+async def create_financial_plans_batch(request: Request):
+    """
+    API tạo task cho nhiều user một lần (VD: chạy lại kế hoạch tuần mỗi thứ Hai).
+    - Input: JSON list các user_data như /generate-plan, hoặc NDJSON
+      (Content-Type: application/x-ndjson, mỗi dòng một user_data)
+    - Output: batch_id + task_id của từng item (theo thứ tự input); tiến độ ở /batches/{batch_id}
+    - 503 + Retry-After khi hàng chờ batch đầy (PLAN_MAX_BATCH_QUEUE_DEPTH) hoặc hệ thống quá tải
+    """
+    body = await request.body()
+    try:
+        if "ndjson" in request.headers.get("content-type", ""):
+            items = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            items = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON list or NDJSON")
+
+    if not isinstance(items, list) or not items:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one item")
+    if len(items) > settings.BATCH_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {settings.BATCH_MAX_SIZE} items")
+
+    invalid = [i for i, item in enumerate(items) if not isinstance(item, dict) or not _has_user_id(item)]
+    if invalid:
+        raise HTTPException(status_code=400, detail={"message": "Missing user_id", "indexes": invalid[:50]})
+
+    # Batch có hàng chờ riêng (PLAN_MAX_BATCH_QUEUE_DEPTH); không nhận thêm khi hệ thống đang trả 503
+    try:
+        await admission.admit_batch(len(items))
+    except AdmissionRejected as e:
+        logger.info("Plan batch rejected", extra={"status_code": e.status_code, "total": len(items)})
+        raise HTTPException(
+            status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)}
+        )
+
+    try:
+        batch_id, task_ids = await init_batch_records(items)
+        logger.info("Plan batch submitted", extra={"batch_id": batch_id, "total": len(task_ids)})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "status": "submitted",
+        "batch_id": batch_id,
+        "total": len(task_ids),
+        "task_ids": task_ids,
+        "progress_url": f"/api/finance/batches/{batch_id}",
+    }
+
+
+@router.post("/retry/{task_id}", status_code=202)
+async def retry_financial_plan(task_id: str):
+    """
+    Chạy lại task đã COMPLETED/FAILED: thêm một exchange PENDING mới cho cùng task_id,
+    các exchange cũ vẫn giữ trong lịch sử. Task còn đang chạy -> 409.
+    """
+    result = await retry_task(task_id)
+    if result["status"] == "NOT_FOUND":
+        raise HTTPException(status_code=404, detail="Task ID not found")
+    if result["status"] == "CONFLICT":
+        raise HTTPException(status_code=409, detail=f"Task is still {result['current']}")
+
+    return {
+        "status": "submitted",
+        "task_id": task_id,
+        "exchange_id": result["exchange_id"],
+        "poll_url": f"/api/finance/result/{task_id}",
+    }
+
+
+@router.get("/batches/{batch_id}")
+async def get_batch_progress_endpoint(batch_id: str):
+    """Tiến độ của batch: số task theo trạng thái và tỉ lệ đã xong (COMPLETED/FAILED)."""
+    progress = await get_batch_progress(batch_id)
+    if progress.get("status") == "NOT_FOUND":
+        raise HTTPException(status_code=404, detail="Batch ID not found")
+    return progress
+
+
 @router.get("/result/{task_id}")
-async def get_plan_result_endpoint(task_id: str):
+async def get_plan_result_endpoint(
+    task_id: str,
+    wait: float = Query(0, ge=0, description="Long-poll: số giây tối đa chờ task COMPLETED/FAILED"),
+):
     """
-    API Polling để lấy kết quả.
-    Frontend gọi API này mỗi 2-3s cho đến khi status = COMPLETED
+    API lấy kết quả.
+    - wait=0: trả trạng thái hiện tại ngay (polling kiểu cũ).
+    - wait>0: giữ request tới khi task xong hoặc hết thời gian chờ (long-poll).
+    Client cần cập nhật liên tục nên dùng /events/{task_id} (SSE) hoặc /ws/{task_id}.
     """
-    result = await get_task_result(task_id)
+    if wait > 0:
+        result = await wait_for_task_result(task_id, wait)
+    else:
+        result = await get_task_result(task_id)
 
     # Xử lý lỗi nếu không tìm thấy task
     if result.get("status") == "NOT_FOUND":
         raise HTTPException(status_code=404, detail="Task ID not found")
 
-    return result
\ No newline at end of file
+    # Kế hoạch đã lưu sẵn dạng JSON, ghép thẳng vào response
+    return Response(render_json(result), media_type="application/json")
+
+
+@router.get("/metrics")
+async def get_plan_metrics(
+    windows: str = Query(",".join(DEFAULT_WINDOWS), description="Các cửa sổ thời gian, VD: 15m,1h,24h,7d"),
+):
+    """
+    Số liệu sinh kế hoạch theo cửa sổ thời gian: p50/p95/p99 latency và TTFC,
+    token trung bình mỗi request, tỉ lệ lỗi của model; tỉ lệ cache hit và kế hoạch theo quy tắc
+    đếm riêng. Kèm độ sâu hàng đợi, số request bị từ chối,
+    trạng thái circuit breaker và số liệu cache của process hiện tại.
+    """
+    window_list = [w.strip() for w in windows.split(",") if w.strip()]
+    try:
+        for window in window_list:
+            parse_window(window)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "windows": await collect_metrics(window_list),
+        "queue": await admission.snapshot(),
+        "breaker": breaker.snapshot(),
+        "cache": {
+            "hits": plan_cache.hits,
+            "misses": plan_cache.misses,
+            "coalesced": plan_cache.coalesced,
+        },
+    }
+
+
+@router.get("/events/{task_id}")
+async def stream_plan_events(task_id: str):
+    """
+    Server-Sent Events: đẩy trạng thái task mỗi khi đổi, đóng stream khi COMPLETED/FAILED.
+    """
+    if (await get_task_result(task_id)).get("status") == "NOT_FOUND":
+        raise HTTPException(status_code=404, detail="Task ID not found")
+
+    async def event_source():
+        async for update in watch_task(task_id):
+            if update is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: status\ndata: {render_json(update)}\n\n"
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/ws/{task_id}")
+async def plan_events_socket(websocket: WebSocket, task_id: str):
+    """WebSocket: gửi cùng các cập nhật như /events/{task_id} dưới dạng JSON message."""
+    await websocket.accept()
+    try:
+        async for update in watch_task(task_id):
+            if update is not None:
+                await websocket.send_text(render_json(update))
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
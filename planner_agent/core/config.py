@@ -0,0 +1,102 @@
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+class Settings:
+    """Cấu hình planner_agent, đọc từ biến môi trường."""
+
+    # --- Database (pool của Prisma query engine) ---
+    # Mỗi process (API, worker) có pool riêng; tổng các process phải nhỏ hơn max_connections của Postgres
+    DB_CONNECTION_LIMIT: int = _env_int("PLAN_DB_CONNECTION_LIMIT", 10)
+    DB_POOL_TIMEOUT_S: int = _env_int("PLAN_DB_POOL_TIMEOUT_S", 10)
+
+    # --- Queue / Worker ---
+    # Chạy worker ngay trong process API (dev). Tắt đi khi chạy `python worker.py` riêng.
+    EMBEDDED_WORKER: bool = _env_bool("PLAN_EMBEDDED_WORKER", True)
+    WORKER_CONCURRENCY: int = _env_int("PLAN_WORKER_CONCURRENCY", 4)
+    WORKER_POLL_INTERVAL_S: float = _env_float("PLAN_WORKER_POLL_INTERVAL_S", 1.0)
+    # Hết thời gian này mà worker chưa gia hạn thì task được worker khác nhận lại
+    VISIBILITY_TIMEOUT_S: int = _env_int("PLAN_VISIBILITY_TIMEOUT_S", 120)
+    MAX_ATTEMPTS: int = _env_int("PLAN_MAX_ATTEMPTS", 3)
+    RETRY_BACKOFF_S: float = _env_float("PLAN_RETRY_BACKOFF_S", 5.0)
+    RETRY_BACKOFF_MAX_S: float = _env_float("PLAN_RETRY_BACKOFF_MAX_S", 300.0)
+    # Reaper: job PROCESSING quá hạn lock thêm REAPER_GRACE_S thì trả về PENDING hoặc FAILED
+    REAPER_INTERVAL_S: float = _env_float("PLAN_REAPER_INTERVAL_S", 30.0)
+    REAPER_GRACE_S: float = _env_float("PLAN_REAPER_GRACE_S", 30.0)
+
+    # --- Admission control (services/admission.py) ---
+    RATE_LIMIT_PER_MIN: float = _env_float("PLAN_RATE_LIMIT_PER_MIN", 6.0)
+    RATE_LIMIT_BURST: int = _env_int("PLAN_RATE_LIMIT_BURST", 3)
+    # Số exchange PENDING (không tính batch) tối đa; vượt quá thì /generate-plan trả 503
+    MAX_QUEUE_DEPTH: int = _env_int("PLAN_MAX_QUEUE_DEPTH", 500)
+    QUEUE_DEPTH_CACHE_S: float = _env_float("PLAN_QUEUE_DEPTH_CACHE_S", 1.0)
+    ADMISSION_RETRY_AFTER_S: float = _env_float("PLAN_ADMISSION_RETRY_AFTER_S", 30.0)
+    # /generate-plans/batch: số item tối đa mỗi request, priority của job batch
+    BATCH_MAX_SIZE: int = _env_int("PLAN_BATCH_MAX_SIZE", 5000)
+    BATCH_PRIORITY: int = _env_int("PLAN_BATCH_PRIORITY", -10)
+    # Số job batch PENDING tối đa (cả batch mới); vượt quá thì /generate-plans/batch trả 503
+    MAX_BATCH_QUEUE_DEPTH: int = _env_int("PLAN_MAX_BATCH_QUEUE_DEPTH", 20000)
+
+    # --- Task events (SSE / WebSocket / long-poll) ---
+    # "postgres": LISTEN/NOTIFY giữa các process, "memory": chỉ trong process API
+    EVENTS_BACKEND: str = os.getenv("PLAN_EVENTS_BACKEND", "postgres")
+    EVENTS_KEEPALIVE_S: float = _env_float("PLAN_EVENTS_KEEPALIVE_S", 15.0)
+    LONG_POLL_MAX_WAIT_S: float = _env_float("PLAN_LONG_POLL_MAX_WAIT_S", 60.0)
+
+    # --- Model backend: "gemini" hoặc "fake" (model giả cục bộ, xem utils/model_backends.py) ---
+    MODEL_BACKEND: str = os.getenv("PLAN_MODEL_BACKEND", "gemini")
+    FAKE_TOKENS_PER_S: float = _env_float("PLAN_FAKE_TOKENS_PER_S", 200.0)
+    FAKE_CHUNK_TOKENS: int = _env_int("PLAN_FAKE_CHUNK_TOKENS", 20)
+    FAKE_ERROR_RATE: float = _env_float("PLAN_FAKE_ERROR_RATE", 0.0)
+    FAKE_CONNECT_LATENCY_S: float = _env_float("PLAN_FAKE_CONNECT_LATENCY_S", 0.3)
+    FAKE_SEED: int = _env_int("PLAN_FAKE_SEED", 0)
+
+    # Lượt thử cuối vẫn lỗi thì hoàn thành bằng kế hoạch theo quy tắc (utils/rule_planner.py)
+    RULE_FALLBACK: bool = _env_bool("PLAN_RULE_FALLBACK", True)
+
+    # --- Context cache của Gemini cho system instruction (utils/model_backends.GeminiBackend) ---
+    CONTEXT_CACHE_ENABLED: bool = _env_bool("PLAN_CONTEXT_CACHE", True)
+    CONTEXT_CACHE_TTL_S: float = _env_float("PLAN_CONTEXT_CACHE_TTL_S", 3600.0)
+    CONTEXT_CACHE_RETRY_S: float = _env_float("PLAN_CONTEXT_CACHE_RETRY_S", 300.0)
+
+    # --- Chống lỗi quanh lời gọi model (utils/resilience.py) ---
+    MODEL_DEADLINE_S: float = _env_float("PLAN_MODEL_DEADLINE_S", 90.0)
+    MODEL_FIRST_CHUNK_TIMEOUT_S: float = _env_float("PLAN_MODEL_FIRST_CHUNK_TIMEOUT_S", 30.0)
+    # Gửi thêm request nếu chưa có chunk đầu sau chừng này giây (0 = tắt)
+    MODEL_HEDGE_AFTER_S: float = _env_float("PLAN_MODEL_HEDGE_AFTER_S", 0.0)
+    MODEL_RETRIES: int = _env_int("PLAN_MODEL_RETRIES", 2)
+    MODEL_RETRY_BACKOFF_S: float = _env_float("PLAN_MODEL_RETRY_BACKOFF_S", 1.0)
+    MODEL_RETRY_BACKOFF_MAX_S: float = _env_float("PLAN_MODEL_RETRY_BACKOFF_MAX_S", 10.0)
+    BREAKER_WINDOW_S: float = _env_float("PLAN_BREAKER_WINDOW_S", 60.0)
+    BREAKER_MIN_CALLS: int = _env_int("PLAN_BREAKER_MIN_CALLS", 10)
+    BREAKER_ERROR_RATE: float = _env_float("PLAN_BREAKER_ERROR_RATE", 0.5)
+    BREAKER_OPEN_S: float = _env_float("PLAN_BREAKER_OPEN_S", 30.0)
+
+    # --- Model client (một client dùng chung mỗi process) ---
+    MODEL_CONCURRENCY: int = _env_int("PLAN_MODEL_CONCURRENCY", 8)
+    MODEL_MAX_CONNECTIONS: int = _env_int("PLAN_MODEL_MAX_CONNECTIONS", 16)
+    MODEL_TIMEOUT_S: float = _env_float("PLAN_MODEL_TIMEOUT_S", 120.0)
+
+    # --- Cache kết quả sinh kế hoạch (0 entry = tắt) ---
+    PLAN_CACHE_TTL_S: float = _env_float("PLAN_CACHE_TTL_S", 6 * 3600)
+    PLAN_CACHE_MAX_ENTRIES: int = _env_int("PLAN_CACHE_MAX_ENTRIES", 256)
+
+    # --- Logging (core/log.py) ---
+    LOG_LEVEL: str = os.getenv("PLAN_LOG_LEVEL", "INFO").upper()
+    LOG_QUEUE_SIZE: int = _env_int("PLAN_LOG_QUEUE_SIZE", 10000)
+    # Tỉ lệ giữ lại log từng chunk của model (mức DEBUG)
+    LOG_CHUNK_SAMPLE_RATE: float = _env_float("PLAN_LOG_CHUNK_SAMPLE_RATE", 0.01)
+
+
+settings = Settings()
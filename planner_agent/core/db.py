@@ -1,4 +1,22 @@
+import os
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
 from prisma import Prisma
 
-# Global instance
-db = Prisma()
\ No newline at end of file
+from core.config import settings
+
+
+def _datasource():
+    # Giới hạn pool của query engine qua tham số URL (connection_limit / pool_timeout)
+    url = os.getenv("DATABASE_URL")
+    if not url:
+        return None  # để Prisma tự đọc .env như trước
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    query.setdefault("connection_limit", str(settings.DB_CONNECTION_LIMIT))
+    query.setdefault("pool_timeout", str(settings.DB_POOL_TIMEOUT_S))
+    return {"url": urlunsplit(parts._replace(query=urlencode(query)))}
+
+
+# Global instance, mở/đóng trong lifespan của app (main.py) hoặc worker.py
+db = Prisma(datasource=_datasource())
@@ -0,0 +1,63 @@
+import asyncio
+import contextlib
+import os
+from typing import TYPE_CHECKING
+
+from core.config import settings
+
+if TYPE_CHECKING:
+    from google import genai
+
+
+class ModelClient:
+    """
+    Một genai.Client dùng chung cho cả process (API hoặc worker), mở/đóng theo vòng đời app.
+    Dùng chung pool kết nối HTTP, giới hạn số lần sinh đồng thời bằng semaphore.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._semaphore = None
+
+    def start(self):
+        if self._client is not None:
+            return
+        # Import SDK ở đây: process không gọi Gemini (API tách worker, backend "fake") khỏi tốn thời gian import
+        import httpx
+        from google import genai
+        from google.genai import types
+
+        limits = httpx.Limits(
+            max_connections=settings.MODEL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.MODEL_MAX_CONNECTIONS,
+        )
+        self._client = genai.Client(
+            api_key=os.getenv("GEMINI_API_KEY"),
+            http_options=types.HttpOptions(
+                timeout=int(settings.MODEL_TIMEOUT_S * 1000),  # ms
+                async_client_args={"limits": limits},
+            ),
+        )
+
+    async def close(self):
+        if self._client is None:
+            return
+        with contextlib.suppress(Exception):
+            await self._client.aio.aclose()
+        self._client = None
+
+    @property
+    def client(self) -> "genai.Client":
+        # Script chạy lẻ (không qua lifespan) vẫn dùng được
+        self.start()
+        return self._client
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Giới hạn chung cho mọi backend, không cần mở client (backend "fake" chạy không có API key)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(settings.MODEL_CONCURRENCY)
+        return self._semaphore
+
+
+model_client = ModelClient()
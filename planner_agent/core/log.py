@@ -0,0 +1,123 @@
+"""
+Log có cấu trúc (JSON, mỗi dòng một bản ghi) ghi qua hàng đợi, không chặn event loop.
+
+- Handler trên event loop (`_NonBlockingQueueHandler`) chỉ gắn request_id/task_id rồi đẩy
+  LogRecord vào queue; format JSON và ghi stdout chạy ở thread của QueueListener. Queue đầy
+  thì bỏ bản ghi và đếm số bản bị bỏ (`dropped`), không bao giờ chờ.
+- Sự kiện tần suất cao (VD: từng chunk của model) truyền `extra={"sample_rate": 0.01}` để
+  chỉ giữ lại một phần.
+- request_id lấy từ header X-Request-ID (hoặc tự sinh) qua `RequestIdMiddleware`; worker gắn
+  task_id khi xử lý job, nên log của API và worker cho cùng một task ghép lại được.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import random
+import sys
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from core.config import settings
+
+request_id_var: contextvars.ContextVar = contextvars.ContextVar("request_id", default=None)
+task_id_var: contextvars.ContextVar = contextvars.ContextVar("task_id", default=None)
+
+# Thuộc tính có sẵn của LogRecord; phần còn lại (truyền qua extra=) là trường có cấu trúc
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sample_rate"}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and value is not None:
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        sample_rate = getattr(record, "sample_rate", None)
+        if sample_rate is not None and random.random() >= sample_rate:
+            return False
+        # Context var phải đọc ở thread phát log, thread ghi không thấy
+        record.__dict__.setdefault("request_id", request_id_var.get())
+        record.__dict__.setdefault("task_id", task_id_var.get())
+        return super().filter(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Không format ở đây (QueueHandler mặc định format ngay trên thread gọi)
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging():
+    """Gắn handler hàng đợi vào root logger (gọi một lần khi process khởi động)."""
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter())
+    _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+
+    root = logging.getLogger()
+    root.handlers = [_NonBlockingQueueHandler(log_queue)]
+    root.setLevel(settings.LOG_LEVEL)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Ghi nốt các bản ghi còn trong queue rồi dừng thread ghi."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class RequestIdMiddleware:
+    """ASGI middleware: đặt request_id cho mỗi request/WebSocket và trả lại qua header X-Request-ID."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or ())
+        request_id = (headers.get(b"x-request-id") or b"").decode("latin-1")[:64] or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
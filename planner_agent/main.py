@@ -1,17 +1,38 @@
 # app/main.py
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from controllers import finance_agent_controller
+from core.config import settings
 from core.db import db
+from core.genai_client import model_client
+from core.log import RequestIdMiddleware, setup_logging, shutdown_logging
+from services.plan_worker import PlanWorker
+from services.task_events import task_events
 
-app = FastAPI(title="AI Finance Model Server")
+worker = PlanWorker()
 
-@app.on_event("startup")
-async def startup():
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logging()
     await db.connect()
+    await task_events.start_listener()
+    if settings.EMBEDDED_WORKER:
+        # Chỉ process có worker mới gọi model; process API thuần không import google.genai
+        if settings.MODEL_BACKEND == "gemini":
+            model_client.start()
+        worker.start()
+    try:
+        yield
+    finally:
+        await worker.stop()
+        await task_events.stop_listener()
+        await model_client.close()
+        await db.disconnect()
+        shutdown_logging()
 
-@app.on_event("shutdown")
-async def shutdown():
-    await db.disconnect()
+app = FastAPI(title="AI Finance Model Server", lifespan=lifespan)
+app.add_middleware(RequestIdMiddleware)
 
 app.include_router(finance_agent_controller.router)
 
@@ -0,0 +1,7 @@
+-- AlterTable
+ALTER TABLE "planExchange" ADD COLUMN     "attempts" INTEGER NOT NULL DEFAULT 0,
+ADD COLUMN     "availableAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+ADD COLUMN     "lockedUntil" TIMESTAMP(3);
+
+-- CreateIndex
+CREATE INDEX "planExchange_status_availableAt_idx" ON "planExchange"("status", "availableAt");
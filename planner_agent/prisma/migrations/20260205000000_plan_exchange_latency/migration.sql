@@ -0,0 +1,3 @@
+-- AlterTable
+ALTER TABLE "planExchange" ADD COLUMN     "connectTime" INTEGER,
+ADD COLUMN     "firstChunkTime" INTEGER;
@@ -0,0 +1,5 @@
+-- AlterTable
+ALTER TABLE "planExchange" ADD COLUMN     "chunkCount" INTEGER;
+
+-- CreateIndex
+CREATE INDEX "planExchange_createdAt_idx" ON "planExchange"("createdAt");
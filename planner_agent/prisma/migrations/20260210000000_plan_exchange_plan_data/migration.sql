@@ -0,0 +1,5 @@
+-- AlterTable
+ALTER TABLE "planExchange" ADD COLUMN     "planData" JSONB;
+
+-- Nén TOAST bằng lz4 (Postgres >= 14): nhỏ hơn text thô, giải nén nhanh hơn pglz mặc định
+ALTER TABLE "planExchange" ALTER COLUMN "planData" SET COMPRESSION lz4;
@@ -0,0 +1,5 @@
+-- DropIndex
+DROP INDEX "planExchange_financePlanId_idx";
+
+-- CreateIndex
+CREATE INDEX "planExchange_financePlanId_id_idx" ON "planExchange"("financePlanId", "id");
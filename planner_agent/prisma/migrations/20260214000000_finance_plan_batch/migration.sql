@@ -0,0 +1,14 @@
+-- AlterTable
+ALTER TABLE "finance_plan" ADD COLUMN     "batchId" TEXT;
+
+-- AlterTable
+ALTER TABLE "planExchange" ADD COLUMN     "priority" INTEGER NOT NULL DEFAULT 0;
+
+-- DropIndex
+DROP INDEX "planExchange_status_availableAt_idx";
+
+-- CreateIndex
+CREATE INDEX "finance_plan_batchId_idx" ON "finance_plan"("batchId");
+
+-- CreateIndex
+CREATE INDEX "planExchange_status_priority_availableAt_idx" ON "planExchange"("status", "priority" DESC, "availableAt");
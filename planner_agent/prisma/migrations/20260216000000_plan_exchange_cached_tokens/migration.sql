@@ -0,0 +1,2 @@
+-- AlterTable
+ALTER TABLE "planExchange" ADD COLUMN     "cachedTokens" INTEGER;
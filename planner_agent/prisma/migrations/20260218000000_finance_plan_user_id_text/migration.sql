@@ -0,0 +1,2 @@
+-- AlterTable: user id của backend_lite là UUID
+ALTER TABLE "finance_plan" ALTER COLUMN "userId" SET DATA TYPE TEXT USING "userId"::text;
@@ -0,0 +1,12 @@
+-- AlterTable
+ALTER TABLE "planExchange" ADD COLUMN     "cacheHit" BOOLEAN NOT NULL DEFAULT false;
+
+-- Bản ghi cũ: kết quả lấy từ cache không có số liệu stream của model. Chỉ xét bản ghi tạo sau khi
+-- cột "chunkCount" có (migration plan_exchange_metrics); bản ghi trước đó đều do model sinh nên giữ false
+UPDATE "planExchange" SET "cacheHit" = true
+WHERE "status" = 'COMPLETED' AND "successCode" = 200 AND "chunkCount" IS NULL
+  AND "createdAt" >= (
+    SELECT "finished_at" FROM "_prisma_migrations"
+    WHERE "migration_name" = '20260208000000_plan_exchange_metrics' AND "finished_at" IS NOT NULL
+    ORDER BY "finished_at" LIMIT 1
+  );
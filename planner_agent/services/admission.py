@@ -0,0 +1,109 @@
+"""
+Kiểm soát nhận task sinh kế hoạch trước khi ghi vào hàng đợi.
+
+- Mỗi user_id có một token bucket (PLAN_RATE_LIMIT_PER_MIN, PLAN_RATE_LIMIT_BURST); hết token -> 429.
+- Số lần sinh đồng thời đã bị chặn bởi số slot worker (PLAN_WORKER_CONCURRENCY); phần chờ là
+  các exchange PENDING. Hàng chờ vượt PLAN_MAX_QUEUE_DEPTH -> 503.
+- Batch (/generate-plans/batch) có giới hạn riêng: job batch đang chờ cộng cả batch mới vượt
+  PLAN_MAX_BATCH_QUEUE_DEPTH, hoặc hàng chờ thường đã đầy -> 503.
+Cả hai trả kèm Retry-After. Bucket nằm trong từng process API.
+"""
+import math
+import time
+
+from core.config import settings
+from services import plan_queue
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = max(math.ceil(retry_after), 1)
+
+
+class TokenBucketLimiter:
+    """Token bucket theo key: `rate_per_s` token/giây, tối đa `burst` token."""
+
+    def __init__(self, rate_per_s: float, burst: int, max_keys: int = 10000):
+        self.rate_per_s = rate_per_s
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: dict[str, tuple[float, float]] = {}  # key -> (tokens, updated_at)
+
+    def acquire(self, key: str) -> float:
+        """Lấy một token; trả về 0 nếu được phép, ngược lại số giây cần chờ tới token kế tiếp."""
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate_per_s)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / self.rate_per_s
+
+        self._buckets[key] = (tokens - 1, now)
+        if len(self._buckets) > self.max_keys:
+            self._prune(now)
+        return 0.0
+
+    def _prune(self, now: float):
+        # Bucket đã hồi đầy thì giống bucket mới, bỏ đi được
+        refill_s = self.burst / self.rate_per_s
+        self._buckets = {
+            key: value for key, value in self._buckets.items() if now - value[1] < refill_s
+        }
+
+
+class AdmissionController:
+    def __init__(self):
+        self.limiter = TokenBucketLimiter(
+            rate_per_s=settings.RATE_LIMIT_PER_MIN / 60, burst=settings.RATE_LIMIT_BURST
+        )
+        self._depth = {"pending": 0, "processing": 0}
+        self._depth_at = 0.0
+        self.rejected_rate_limited = 0
+        self.rejected_queue_full = 0
+
+    async def queue_depth(self) -> dict:
+        # Đọc lại từ DB tối đa mỗi QUEUE_DEPTH_CACHE_S giây, không đếm lại ở mọi request
+        if time.monotonic() - self._depth_at > settings.QUEUE_DEPTH_CACHE_S:
+            self._depth = await plan_queue.queue_depth()
+            self._depth_at = time.monotonic()
+        return self._depth
+
+    async def admit(self, user_id):
+        """Ném AdmissionRejected nếu hàng chờ đầy (503) hoặc user vượt giới hạn (429)."""
+        depth = await self.queue_depth()
+        if depth["pending"] >= settings.MAX_QUEUE_DEPTH:
+            self.rejected_queue_full += 1
+            raise AdmissionRejected(503, "Plan queue is full, try again later", settings.ADMISSION_RETRY_AFTER_S)
+
+        wait_s = self.limiter.acquire(str(user_id))
+        if wait_s > 0:
+            self.rejected_rate_limited += 1
+            raise AdmissionRejected(429, "Too many plan requests for this user", wait_s)
+
+        # Tính luôn task vừa nhận cho tới lần đọc DB kế tiếp
+        depth["pending"] += 1
+
+    async def admit_batch(self, size: int):
+        """Ném AdmissionRejected (503) nếu hàng chờ batch không còn chỗ cho `size` job, hoặc hệ thống đang quá tải."""
+        depth = await self.queue_depth()
+        if depth["pending"] >= settings.MAX_QUEUE_DEPTH or depth["batch_pending"] + size > settings.MAX_BATCH_QUEUE_DEPTH:
+            self.rejected_queue_full += 1
+            raise AdmissionRejected(503, "Plan batch queue is full, try again later", settings.ADMISSION_RETRY_AFTER_S)
+
+        depth["batch_pending"] += size
+
+    async def snapshot(self) -> dict:
+        depth = await self.queue_depth()
+        return {
+            **depth,
+            "max_depth": settings.MAX_QUEUE_DEPTH,
+            "max_batch_depth": settings.MAX_BATCH_QUEUE_DEPTH,
+            "rejected_rate_limited": self.rejected_rate_limited,
+            "rejected_queue_full": self.rejected_queue_full,
+        }
+
+
+admission = AdmissionController()
@@ -1,8 +1,19 @@
+import asyncio
 import time
 import json
+import uuid
+from datetime import timedelta
+from prisma import Json
 from prisma.enums import RequestStatus
+from core.config import settings
 from core.db import db
-from utils.planner import generate
+from services.plan_queue import load_user_info
+from services.task_events import task_events, TERMINAL_STATUSES
+from utils.planner import generate, plan_cache_key
+from utils.plan_cache import plan_cache
+from utils.plan_storage import RawJSON, InvalidPlanError, normalize_plan
+from utils.resilience import CircuitOpenError
+from utils.rule_planner import build_rule_plan, provisional_plan
 
 # 1. Khởi tạo Task (Nhận data là Dict thuần)
 async def init_task_record(data: dict) -> str:
@@ -13,118 +24,307 @@ async def init_task_record(data: dict) -> str:
     # Convert dict to JSON string để Prisma có thể lưu
     user_info_json = json.dumps(data, ensure_ascii=False)
 
+    # Plan và exchange PENDING đầu tiên (cũng chính là job trong hàng đợi) tạo trong một nested write:
+    # một round trip, một transaction, không còn plan thiếu exchange khi lệnh create thứ hai lỗi
     new_plan = await db.financeplan.create(
         data={
-            "userId": data.get("user_id"), 
+            # Controller đã kiểm tra user_id; cột TEXT nên id dạng số được ghi theo chuỗi thập phân
+            "userId": str(data["user_id"]),
             "userName": data.get("ho_ten"), # Truy cập kiểu dict
-            "userInfo": user_info_json
-        }
-    )
-
-    # Tạo record Exchange trạng thái PENDING
-    await db.planexchange.create(
-        data={
-            "financePlanId": new_plan.id,
-            "status": RequestStatus.PENDING,
-            "responseTime": 0,
+            "userInfo": user_info_json,
+            "plans": {
+                "create": [{"status": RequestStatus.PENDING, "responseTime": 0}],
+            },
         }
     )
 
     return new_plan.id
 
-# 2. Xử lý Background (Không cần sửa nhiều, chỉ đảm bảo truyền dict)
-async def process_ai_background(plan_id: str, data: dict):
+# Khởi tạo nhiều task một lần (chạy kế hoạch tuần cho cả nhóm user)
+async def init_batch_records(items: list[dict]) -> tuple[str, list[str]]:
     """
-    Hàm này sẽ được gọi bởi BackgroundTasks của FastAPI
+    Tạo plan + exchange PENDING cho mọi item bằng hai lệnh create_many trong một transaction.
+    Trả về (batch_id, danh sách task_id theo đúng thứ tự items).
+    Worker xử lý các exchange này như task lẻ, song song tối đa số slot worker, nhưng sau
+    các request lẻ (priority thấp hơn).
     """
-    # Tìm exchange mới nhất
-    current_exchange = await db.planexchange.find_first(
-        where={"financePlanId": plan_id},
-        order={"id": "desc"}
-    )
-    
-    if not current_exchange:
-        return
+    batch_id = str(uuid.uuid4())
+    # Sinh id phía app để tạo exchange mà không phải đọc lại plan vừa insert
+    task_ids = [str(uuid.uuid4()) for _ in items]
 
-    exchange_id = current_exchange.id
+    # Timeout mặc định của transaction (5s) không đủ cho batch vài nghìn dòng
+    async with db.tx(timeout=timedelta(seconds=60)) as tx:
+        await tx.financeplan.create_many(
+            data=[
+                {
+                    "id": task_id,
+                    "userId": str(item["user_id"]),
+                    "userName": item.get("ho_ten"),
+                    "userInfo": json.dumps(item, ensure_ascii=False),
+                    "batchId": batch_id,
+                }
+                for task_id, item in zip(task_ids, items)
+            ]
+        )
+        await tx.planexchange.create_many(
+            data=[
+                {
+                    "financePlanId": task_id,
+                    "status": RequestStatus.PENDING,
+                    "responseTime": 0,
+                    "priority": settings.BATCH_PRIORITY,
+                }
+                for task_id in task_ids
+            ]
+        )
 
-    try:
-        # Update -> PROCESSING
-        await db.planexchange.update(
-            where={"id": exchange_id},
-            data={"status": RequestStatus.PROCESSING}
+    return batch_id, task_ids
+
+# Trạng thái exchange mới nhất của từng plan trong batch, gộp theo trạng thái
+_BATCH_PROGRESS_SQL = """
+SELECT e."status"::text AS "status", count(*) AS "count"
+FROM "finance_plan" AS f
+JOIN LATERAL (
+  SELECT "status" FROM "planExchange" WHERE "financePlanId" = f."id" ORDER BY "id" DESC LIMIT 1
+) AS e ON TRUE
+WHERE f."batchId" = $1
+GROUP BY 1
+"""
+
+async def get_batch_progress(batch_id: str) -> dict:
+    rows = await db.query_raw(_BATCH_PROGRESS_SQL, batch_id)
+    counts = {status.name: 0 for status in RequestStatus}
+    for row in rows:
+        counts[row["status"]] = int(row["count"])
+
+    total = sum(counts.values())
+    if not total:
+        return {"status": "NOT_FOUND", "message": "Batch ID not found"}
+
+    done = counts["COMPLETED"] + counts["FAILED"]
+    return {
+        "batch_id": batch_id,
+        "status": "COMPLETED" if done == total else "PROCESSING",
+        "total": total,
+        "counts": counts,
+        "progress": round(done / total, 4),
+    }
+
+# Chạy lại một task đã xong/lỗi: thêm exchange PENDING mới vào plan cũ, giữ nguyên lịch sử
+async def retry_task(plan_id: str) -> dict:
+    """
+    Trả về {"status": "NOT_FOUND"}, {"status": "CONFLICT", "current": ...} khi exchange mới nhất
+    còn PENDING/PROCESSING, hoặc {"status": "PENDING", "exchange_id"} khi đã xếp hàng.
+    """
+    async with db.tx() as tx:
+        # Khoá dòng plan để hai lần retry đồng thời không cùng thấy FAILED và tạo hai exchange
+        locked = await tx.query_raw(
+            'SELECT "id" FROM "finance_plan" WHERE "id" = $1 FOR UPDATE', plan_id
+        )
+        if not locked:
+            return {"status": "NOT_FOUND"}
+
+        latest = await tx.planexchange.find_first(
+            where={"financePlanId": plan_id}, order={"id": "desc"}
+        )
+        if latest is not None and latest.status.name not in TERMINAL_STATUSES:
+            return {"status": "CONFLICT", "current": latest.status.name}
+
+        exchange = await tx.planexchange.create(
+            data={"financePlanId": plan_id, "status": RequestStatus.PENDING, "responseTime": 0}
         )
 
-        start_time = time.time()
-        
-        # Gọi AI (data đã là dict, truyền thẳng vào)
-        advice_json_string = await generate(data) 
-        
-        duration_ms = int((time.time() - start_time) * 1000)
+    await task_events.publish(plan_id, "PENDING", retry=True)
+    return {"status": "PENDING", "exchange_id": exchange.id}
+
+# 2. Xử lý một job đã được worker nhận từ hàng đợi (services/plan_worker.py)
+async def process_exchange(plan_id: str, exchange_id: int, attempts: int, data: dict):
+    """
+    Sinh kế hoạch cho exchange đang PROCESSING.
+    Các phần hoàn chỉnh (overview, từng ngày) được lưu tạm vào "plan" và phát sự kiện ngay
+    khi model còn đang viết, để app hiển thị ngày 1 trước khi có ngày 7.
+    Lỗi được ném ra để worker quyết định thử lại (backoff) hay đánh dấu FAILED.
+    """
+    start_time = time.time()
+    partial = {"meta": None, "overview": None, "daily_schedule": []}
 
+    async def on_section(section: dict):
+        if section["section"] == "day":
+            partial["daily_schedule"].append(section["data"])
+        else:
+            partial[section["section"]] = section["data"]
+
+        await db.planexchange.update_many(
+            where={"id": exchange_id, "attempts": attempts, "status": RequestStatus.PROCESSING},
+            data={"plan": json.dumps(partial, ensure_ascii=False)},
+        )
+        await task_events.publish(plan_id, "PROCESSING", partial=section)
+
+    # Gọi AI (data đã là dict, truyền thẳng vào). Input giống hệt (cùng prompt/model/config)
+    # dùng lại kết quả trong cache hoặc chờ chung lần sinh đang chạy.
+    stats = {}
+    generated = False
+
+    async def generate_plan() -> str:
+        nonlocal generated
+        generated = True
+        advice_json_string = await generate(data, on_section=on_section, stats=stats)
         # Nếu AI lỗi hoặc trả về rỗng
         if not advice_json_string:
             raise Exception("AI returned empty response")
+        # Validate một lần ở đây; output sai schema ném lỗi để thử lại và không vào cache
+        return normalize_plan(advice_json_string)
 
-        # Update -> COMPLETED
-        await db.planexchange.update(
-            where={"id": exchange_id},
-            data={
-                "plan": advice_json_string, # Lưu chuỗi JSON vào DB
-                "responseTime": duration_ms,
-                "successCode": 200,
-                "status": RequestStatus.COMPLETED
-            }
-        )
-
+    success_code, error_message = 200, None
+    try:
+        plan_json = await plan_cache.get_or_generate(plan_cache_key(data), generate_plan)
     except Exception as e:
-        print(f"[AI-Worker] Failed: {e}")
-        await db.planexchange.update(
-            where={"id": exchange_id},
-            data={
-                "successCode": 500,
-                "errorMessage": str(e),
-                "status": RequestStatus.FAILED
-            }
-        )
+        # Breaker đang mở (model lỗi hàng loạt): dùng ngay kế hoạch theo quy tắc.
+        # Lỗi khác: còn lượt thử thì để worker xếp lại hàng đợi, lượt cuối mới dùng kế hoạch theo quy tắc
+        retry_later = attempts < settings.MAX_ATTEMPTS and not isinstance(e, CircuitOpenError)
+        if not settings.RULE_FALLBACK or retry_later:
+            raise
+        plan_json = normalize_plan(json.dumps(build_rule_plan(data), ensure_ascii=False))
+        success_code, error_message = 203, f"Rule-based fallback: {e}"
 
-# 3. Lấy kết quả 
-async def get_task_result(plan_id: str) -> dict:
-    plan = await db.financeplan.find_unique(
-        where={"id": plan_id},
-        include={"plans": True} 
+    duration_ms = int((time.time() - start_time) * 1000)
+
+    # Update -> COMPLETED, chỉ khi job vẫn thuộc lượt thử này (chưa bị worker khác nhận lại)
+    await db.planexchange.update_many(
+        where={
+            "id": exchange_id,
+            "attempts": attempts,
+            "status": RequestStatus.PROCESSING,
+        },
+        data={
+            # Kế hoạch đã validate lưu ở JSONB; "plan" chỉ giữ bản sinh dở khi PROCESSING
+            "planData": Json(json.loads(plan_json)),
+            "plan": None,
+            "responseTime": duration_ms,
+            # Các số liệu dưới đây không có khi lấy kết quả từ cache
+            "connectTime": stats.get("connect_ms"),
+            "firstChunkTime": stats.get("first_chunk_ms"),
+            "chunkCount": stats.get("chunk_count"),
+            "promptTokens": stats.get("prompt_tokens"),
+            "completionTokens": stats.get("completion_tokens"),
+            "totalTokens": stats.get("total_tokens"),
+            "cachedTokens": stats.get("cached_tokens"),
+            "cacheHit": success_code == 200 and not generated,
+            "successCode": success_code,
+            "errorMessage": error_message,
+            "lockedUntil": None,
+            "status": RequestStatus.COMPLETED
+        }
     )
 
-    if not plan:
+# 3. Lấy kết quả
+# Exchange mới nhất của plan; "planData" lấy dạng text để trả thẳng, không parse lại mỗi lần poll
+_TASK_RESULT_SQL = """
+SELECT f."id", f."userId", f."createdAt", f."userInfo",
+       e."status"::text AS "status", e."errorMessage", e."plan", e."planData"::text AS "planData"
+FROM "finance_plan" AS f
+LEFT JOIN LATERAL (
+  SELECT * FROM "planExchange" WHERE "financePlanId" = f."id" ORDER BY "id" DESC LIMIT 1
+) AS e ON TRUE
+WHERE f."id" = $1
+"""
+
+
+def _completed_plan(row: dict):
+    if row["planData"] is not None:
+        return RawJSON(row["planData"])
+    # Bản ghi cũ (trước khi có planData): kế hoạch nằm trong "plan" dạng text thô
+    try:
+        return RawJSON(normalize_plan(row["plan"]))
+    except InvalidPlanError:
+        return row["plan"]
+
+
+async def get_task_result(plan_id: str) -> dict:
+    """
+    Trạng thái của task. "data"/"partial" là RawJSON: dùng utils.plan_storage.render_json
+    (không phải jsonable_encoder) khi trả về client.
+    """
+    rows = await db.query_raw(_TASK_RESULT_SQL, plan_id)
+
+    if not rows:
         return {"status": "NOT_FOUND", "message": "Task ID not found"}
+    row = rows[0]
 
     # Mặc định
     result = {
-        "task_id": plan.id,
-        "created_at": plan.createdAt,
-        "status": "PENDING",
+        "task_id": row["id"],
+        "user_id": row["userId"],
+        "created_at": row["createdAt"],
+        "status": row["status"] or "PENDING",
         "data": None,
         "error": None
     }
 
-    # Lấy trạng thái từ record con mới nhất
-    if plan.plans and len(plan.plans) > 0:
-        last_exchange = plan.plans[-1]
-        
-        status_obj = last_exchange.status
-        status_str = status_obj.name if hasattr(status_obj, "name") else str(status_obj)
-
-        result["status"] = status_str
-        
-        # Use string comparison to be safe
-        if status_str == "COMPLETED":
-            # Parse string JSON trong DB thành Dict để trả về frontend
+    if result["status"] == "COMPLETED":
+        result["data"] = _completed_plan(row)
+
+    elif result["status"] == "PROCESSING" and row["plan"]:
+        # Kế hoạch đang sinh dở: trả các phần đã hoàn chỉnh
+        result["partial"] = RawJSON(row["plan"])
+
+    elif result["status"] == "FAILED":
+        result["error"] = row["errorMessage"]
+
+    # Chưa có kết quả từ model: trả kế hoạch theo quy tắc (vài ms) để app hiển thị ngay
+    if result["status"] in ("PENDING", "PROCESSING"):
+        result["provisional"] = provisional_plan(load_user_info(row["userInfo"]))
+
+    return result
+
+# 4. Chờ kết quả theo sự kiện (long-poll / SSE / WebSocket) thay vì poll DB liên tục
+async def wait_for_task_result(plan_id: str, wait: float) -> dict:
+    """Trả kết quả ngay khi task COMPLETED/FAILED, hoặc trạng thái hiện tại sau `wait` giây."""
+    wait = min(wait, settings.LONG_POLL_MAX_WAIT_S)
+    # Subscribe trước khi đọc DB để không lỡ sự kiện xảy ra giữa hai bước
+    async with task_events.subscribe(plan_id) as queue:
+        result = await get_task_result(plan_id)
+        if result["status"] in TERMINAL_STATUSES or result["status"] == "NOT_FOUND":
+            return result
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                event = await asyncio.wait_for(queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if event["status"] in TERMINAL_STATUSES:
+                break
+
+    return await get_task_result(plan_id)
+
+
+async def watch_task(plan_id: str):
+    """
+    Yield trạng thái hiện tại, rồi mỗi lần trạng thái đổi; dừng sau COMPLETED/FAILED.
+    Yield None khi không có gì mới trong EVENTS_KEEPALIVE_S (để gửi keep-alive).
+    """
+    async with task_events.subscribe(plan_id) as queue:
+        result = await get_task_result(plan_id)
+        yield result
+        status = result["status"]
+
+        while status not in TERMINAL_STATUSES and status != "NOT_FOUND":
             try:
-                result["data"] = json.loads(last_exchange.plan)
-            except:
-                result["data"] = last_exchange.plan # Fallback nếu không phải JSON
-        
-        elif status_str == "FAILED":
-            result["error"] = last_exchange.errorMessage
-
-    return result
\ No newline at end of file
+                event = await asyncio.wait_for(queue.get(), settings.EVENTS_KEEPALIVE_S)
+            except asyncio.TimeoutError:
+                event = None
+
+            if event is not None and event["status"] not in TERMINAL_STATUSES:
+                status = event["status"]
+                yield event
+                continue
+
+            # Sự kiện kết thúc, hoặc lâu không có sự kiện (phòng mất NOTIFY): đọc lại từ DB
+            result = await get_task_result(plan_id)
+            if result["status"] == status:
+                yield None
+                continue
+            status = result["status"]
+            yield result
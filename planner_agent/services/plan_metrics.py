@@ -0,0 +1,109 @@
+"""
+Số liệu vận hành của việc sinh kế hoạch, tổng hợp trực tiếp từ bảng "planExchange".
+
+Mỗi exchange lưu thời gian phản hồi, thời gian tới chunk đầu tiên (TTFC), số chunk và
+token (usage_metadata của Gemini, gồm token prompt đọc từ context cache). Endpoint /api/finance/metrics tính p50/p95/p99,
+token trung bình mỗi request và tỉ lệ lỗi theo từng cửa sổ thời gian.
+
+Exchange lấy kết quả từ cache ("cacheHit") và exchange dùng kế hoạch theo quy tắc (successCode 203)
+không phản ánh model: chúng được đếm riêng (cache_hit_rate, fallback_rate) và không vào
+percentile, token hay tỉ lệ lỗi của model.
+"""
+import re
+
+from core.db import db
+
+DEFAULT_WINDOWS = ("15m", "1h", "24h")
+_WINDOW_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+_WINDOW_RE = re.compile(r"^(\d+)([smhd])$")
+
+# Chỉ tính exchange đã kết thúc. Percentile, token và số chunk chỉ lấy exchange do model sinh
+# (COMPLETED, không phải cache hit hay kế hoạch theo quy tắc)
+_METRICS_SQL = """
+WITH finished AS (
+  SELECT *,
+    "status" = 'COMPLETED'::"RequestStatus" AND NOT "cacheHit" AND "successCode" <> 203 AS "modelCompleted"
+  FROM "planExchange"
+  WHERE "createdAt" >= NOW() - make_interval(secs => $1)
+    AND "status" IN ('COMPLETED'::"RequestStatus", 'FAILED'::"RequestStatus")
+)
+SELECT
+  count(*) AS "requests",
+  count(*) FILTER (WHERE "status" = 'COMPLETED'::"RequestStatus") AS "completed",
+  count(*) FILTER (WHERE "status" = 'FAILED'::"RequestStatus") AS "failed",
+  count(*) FILTER (WHERE "cacheHit") AS "cache_hits",
+  count(*) FILTER (WHERE "status" = 'COMPLETED'::"RequestStatus" AND "successCode" = 203) AS "rule_fallbacks",
+  count(*) FILTER (WHERE "modelCompleted") AS "model_completed",
+  percentile_cont(0.5) WITHIN GROUP (ORDER BY "responseTime") FILTER (WHERE "modelCompleted") AS "latency_p50",
+  percentile_cont(0.95) WITHIN GROUP (ORDER BY "responseTime") FILTER (WHERE "modelCompleted") AS "latency_p95",
+  percentile_cont(0.99) WITHIN GROUP (ORDER BY "responseTime") FILTER (WHERE "modelCompleted") AS "latency_p99",
+  percentile_cont(0.5) WITHIN GROUP (ORDER BY "firstChunkTime") FILTER (WHERE "modelCompleted") AS "ttfc_p50",
+  percentile_cont(0.95) WITHIN GROUP (ORDER BY "firstChunkTime") FILTER (WHERE "modelCompleted") AS "ttfc_p95",
+  percentile_cont(0.99) WITHIN GROUP (ORDER BY "firstChunkTime") FILTER (WHERE "modelCompleted") AS "ttfc_p99",
+  avg("promptTokens") FILTER (WHERE "modelCompleted")::float AS "prompt_tokens_avg",
+  avg("completionTokens") FILTER (WHERE "modelCompleted")::float AS "completion_tokens_avg",
+  avg("totalTokens") FILTER (WHERE "modelCompleted")::float AS "total_tokens_avg",
+  avg("cachedTokens") FILTER (WHERE "modelCompleted")::float AS "cached_tokens_avg",
+  coalesce(sum("totalTokens"), 0)::bigint AS "total_tokens_sum",
+  coalesce(sum("cachedTokens"), 0)::bigint AS "cached_tokens_sum",
+  avg("chunkCount") FILTER (WHERE "modelCompleted")::float AS "chunks_avg"
+FROM finished
+"""
+
+
+def parse_window(window: str) -> int:
+    """'15m' / '1h' / '7d' -> số giây. ValueError nếu sai định dạng."""
+    match = _WINDOW_RE.match(window.strip())
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError(f"Invalid window: {window!r}")
+    return int(match.group(1)) * _WINDOW_UNITS[match.group(2)]
+
+
+def _round(value):
+    return round(float(value), 1) if value is not None else None
+
+
+async def window_metrics(window: str) -> dict:
+    rows = await db.query_raw(_METRICS_SQL, parse_window(window))
+    row = rows[0] if rows else {}
+    requests = int(row.get("requests") or 0)
+    failed = int(row.get("failed") or 0)
+    cache_hits = int(row.get("cache_hits") or 0)
+    rule_fallbacks = int(row.get("rule_fallbacks") or 0)
+    # Mẫu số của tỉ lệ lỗi model: exchange thật sự chờ model (thành công do model sinh hoặc FAILED)
+    model_requests = int(row.get("model_completed") or 0) + failed
+    return {
+        "window": window,
+        "requests": requests,
+        "completed": int(row.get("completed") or 0),
+        "failed": failed,
+        "failure_rate": round(failed / model_requests, 4) if model_requests else 0.0,
+        "cache_hits": cache_hits,
+        "cache_hit_rate": round(cache_hits / requests, 4) if requests else 0.0,
+        "rule_fallbacks": rule_fallbacks,
+        "fallback_rate": round(rule_fallbacks / requests, 4) if requests else 0.0,
+        "latency_ms": {
+            "p50": _round(row.get("latency_p50")),
+            "p95": _round(row.get("latency_p95")),
+            "p99": _round(row.get("latency_p99")),
+        },
+        "first_chunk_ms": {
+            "p50": _round(row.get("ttfc_p50")),
+            "p95": _round(row.get("ttfc_p95")),
+            "p99": _round(row.get("ttfc_p99")),
+        },
+        "tokens_per_request": {
+            "prompt": _round(row.get("prompt_tokens_avg")),
+            "completion": _round(row.get("completion_tokens_avg")),
+            "total": _round(row.get("total_tokens_avg")),
+            # Token prompt lấy từ context cache thay vì gửi lại
+            "prompt_saved": _round(row.get("cached_tokens_avg")),
+        },
+        "total_tokens": int(row.get("total_tokens_sum") or 0),
+        "prompt_tokens_saved": int(row.get("cached_tokens_sum") or 0),
+        "chunks_per_request": _round(row.get("chunks_avg")),
+    }
+
+
+async def collect_metrics(windows=DEFAULT_WINDOWS) -> list[dict]:
+    return [await window_metrics(window) for window in windows]
@@ -0,0 +1,150 @@
+"""
+Hàng đợi bền vững trên bảng "planExchange".
+
+Mỗi exchange PENDING là một job. Worker nhận job bằng SELECT ... FOR UPDATE SKIP LOCKED
+nên nhiều worker (nhiều process) chạy song song mà không nhận trùng. Job "priority" cao được
+nhận trước (job batch dùng priority âm để không chặn request lẻ). Job đang PROCESSING
+có "lockedUntil" (visibility timeout); worker chết thì hết hạn và job được nhận lại.
+Job hết hạn lock mà đã dùng hết lượt thử không bao giờ được nhận lại, nên `reap_stale`
+(chạy định kỳ trong PlanWorker) chuyển nó sang FAILED thay vì để kẹt ở PROCESSING.
+"""
+import json
+
+from core.config import settings
+from core.db import db
+
+_CLAIM_SQL = """
+UPDATE "planExchange" AS e
+SET "status" = 'PROCESSING'::"RequestStatus",
+    "attempts" = e."attempts" + 1,
+    "lockedUntil" = NOW() + make_interval(secs => $1),
+    "plan" = NULL
+FROM "finance_plan" AS f
+WHERE f."id" = e."financePlanId"
+  AND e."id" IN (
+    SELECT "id" FROM "planExchange"
+    WHERE ("status" = 'PENDING'::"RequestStatus" AND "availableAt" <= NOW())
+       OR ("status" = 'PROCESSING'::"RequestStatus" AND "lockedUntil" < NOW() AND "attempts" < $2)
+    ORDER BY "priority" DESC, "availableAt", "id"
+    LIMIT $3
+    FOR UPDATE SKIP LOCKED
+  )
+RETURNING e."id", e."financePlanId", e."attempts", f."userInfo"
+"""
+
+_HEARTBEAT_SQL = """
+UPDATE "planExchange"
+SET "lockedUntil" = NOW() + make_interval(secs => $1)
+WHERE "id" = $2 AND "attempts" = $3 AND "status" = 'PROCESSING'::"RequestStatus"
+"""
+
+_RETRY_SQL = """
+UPDATE "planExchange"
+SET "status" = 'PENDING'::"RequestStatus",
+    "availableAt" = NOW() + make_interval(secs => $1),
+    "lockedUntil" = NULL,
+    "errorMessage" = $2
+WHERE "id" = $3 AND "attempts" = $4 AND "status" = 'PROCESSING'::"RequestStatus"
+"""
+
+_FAIL_SQL = """
+UPDATE "planExchange"
+SET "status" = 'FAILED'::"RequestStatus",
+    "lockedUntil" = NULL,
+    "successCode" = 500,
+    "errorMessage" = $1
+WHERE "id" = $2 AND "attempts" = $3 AND "status" = 'PROCESSING'::"RequestStatus"
+"""
+
+_DEPTH_SQL = """
+SELECT count(*) FILTER (WHERE "status" = 'PENDING'::"RequestStatus" AND "priority" >= 0) AS "pending",
+       count(*) FILTER (WHERE "status" = 'PENDING'::"RequestStatus" AND "priority" < 0) AS "batch_pending",
+       count(*) FILTER (WHERE "status" = 'PROCESSING'::"RequestStatus") AS "processing"
+FROM "planExchange"
+WHERE "status" IN ('PENDING'::"RequestStatus", 'PROCESSING'::"RequestStatus")
+"""
+
+# Exchange PROCESSING đã hết lock quá REAPER_GRACE_S (worker chết/treo): còn lượt thử thì trả về
+# PENDING, hết lượt thì FAILED. Bản ghi cũ không có lockedUntil tính hạn theo createdAt.
+_REAP_SQL = """
+UPDATE "planExchange" AS e
+SET "status" = (CASE WHEN e."attempts" < $1 THEN 'PENDING' ELSE 'FAILED' END)::"RequestStatus",
+    "lockedUntil" = NULL,
+    "availableAt" = NOW(),
+    "successCode" = CASE WHEN e."attempts" < $1 THEN e."successCode" ELSE 504 END,
+    "errorMessage" = $2
+WHERE e."status" = 'PROCESSING'::"RequestStatus"
+  AND COALESCE(e."lockedUntil", e."createdAt" + make_interval(secs => $3)) < NOW() - make_interval(secs => $4)
+RETURNING e."id", e."financePlanId", e."status"::text AS "status"
+"""
+
+
+def load_user_info(value):
+    # userInfo được lưu bằng json.dumps nên có thể đọc ra là chuỗi JSON
+    while isinstance(value, str):
+        value = json.loads(value)
+    return value or {}
+
+
+async def claim_jobs(limit: int = 1) -> list[dict]:
+    """Nhận tối đa `limit` job, chuyển sang PROCESSING và tăng attempts."""
+    rows = await db.query_raw(
+        _CLAIM_SQL, settings.VISIBILITY_TIMEOUT_S, settings.MAX_ATTEMPTS, limit
+    )
+    return [
+        {
+            "exchange_id": row["id"],
+            "plan_id": row["financePlanId"],
+            "attempts": row["attempts"],
+            "user_data": load_user_info(row["userInfo"]),
+        }
+        for row in rows
+    ]
+
+
+async def heartbeat(exchange_id: int, attempts: int) -> bool:
+    """Gia hạn visibility timeout; False nếu job đã bị worker khác nhận lại."""
+    updated = await db.execute_raw(
+        _HEARTBEAT_SQL, settings.VISIBILITY_TIMEOUT_S, exchange_id, attempts
+    )
+    return updated > 0
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff: RETRY_BACKOFF_S * 2^(attempts-1), có trần."""
+    return min(settings.RETRY_BACKOFF_S * 2 ** (attempts - 1), settings.RETRY_BACKOFF_MAX_S)
+
+
+async def release_failed(exchange_id: int, attempts: int, error: str) -> bool:
+    """
+    Trả job lỗi về hàng đợi (kèm backoff) nếu còn lượt thử, ngược lại đánh dấu FAILED.
+    Trả về True nếu job sẽ được thử lại.
+    """
+    if attempts < settings.MAX_ATTEMPTS:
+        await db.execute_raw(_RETRY_SQL, retry_delay(attempts), error, exchange_id, attempts)
+        return True
+
+    await db.execute_raw(_FAIL_SQL, error, exchange_id, attempts)
+    return False
+
+
+async def queue_depth() -> dict:
+    """Số job đang chờ (PENDING, tách riêng job batch ưu tiên thấp) và đang chạy (PROCESSING)."""
+    rows = await db.query_raw(_DEPTH_SQL)
+    row = rows[0] if rows else {}
+    return {key: int(row.get(key) or 0) for key in ("pending", "batch_pending", "processing")}
+
+
+async def reap_stale() -> list[dict]:
+    """Giải phóng các exchange bị kẹt ở PROCESSING; trả về các exchange đã đổi trạng thái."""
+    rows = await db.query_raw(
+        _REAP_SQL,
+        settings.MAX_ATTEMPTS,
+        "Worker stopped responding before the plan was finished",
+        settings.VISIBILITY_TIMEOUT_S,
+        settings.REAPER_GRACE_S,
+    )
+    return [
+        {"exchange_id": row["id"], "plan_id": row["financePlanId"], "status": row["status"]}
+        for row in rows
+    ]
@@ -0,0 +1,121 @@
+import asyncio
+import contextlib
+import logging
+
+from core.config import settings
+from core.log import task_id_var
+from services import plan_queue
+from services.finance_agent_service import process_exchange
+from services.task_events import task_events
+
+logger = logging.getLogger(__name__)
+
+
+class PlanWorker:
+    """
+    Chạy `concurrency` vòng lặp, mỗi vòng nhận một job từ plan_queue và sinh kế hoạch,
+    cùng một vòng reaper giải phóng các job bị kẹt ở PROCESSING.
+    Dùng được cả trong process API (lifespan) lẫn process riêng (worker.py).
+    """
+
+    def __init__(self, concurrency: int = None, poll_interval: float = None):
+        self.concurrency = concurrency or settings.WORKER_CONCURRENCY
+        self.poll_interval = poll_interval or settings.WORKER_POLL_INTERVAL_S
+        self._stopping = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self):
+        self._stopping.clear()
+        self._tasks = [
+            asyncio.create_task(self._run_slot(), name=f"plan-worker-{slot}")
+            for slot in range(self.concurrency)
+        ]
+        self._tasks.append(asyncio.create_task(self._run_reaper(), name="plan-reaper"))
+
+    async def stop(self, grace_period: float = 10.0):
+        """Ngừng nhận job mới, chờ job đang chạy trong `grace_period` rồi huỷ."""
+        self._stopping.set()
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(self._tasks, timeout=grace_period)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._tasks = []
+
+    async def run_forever(self):
+        self.start()
+        await asyncio.gather(*self._tasks)
+
+    async def _run_slot(self):
+        while not self._stopping.is_set():
+            try:
+                jobs = await plan_queue.claim_jobs(limit=1)
+            except Exception:
+                logger.exception("Claim failed")
+                jobs = []
+
+            if not jobs:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+                continue
+
+            # Lỗi của một job không được làm chết slot: không có gì khởi động lại slot này
+            try:
+                await self._handle(jobs[0])
+            except Exception:
+                logger.exception("Unhandled error while handling job", extra={"exchange_id": jobs[0]["exchange_id"]})
+
+    async def _run_reaper(self):
+        # Mọi process worker đều chạy; câu UPDATE có điều kiện nên chạy trùng cũng không sao
+        while not self._stopping.is_set():
+            try:
+                for reaped in await plan_queue.reap_stale():
+                    logger.warning("Reaped stale exchange", extra={**reaped, "task_id": reaped["plan_id"]})
+                    await task_events.publish(reaped["plan_id"], reaped["status"], error="worker lost")
+            except Exception:
+                logger.exception("Reaper failed")
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._stopping.wait(), settings.REAPER_INTERVAL_S)
+
+    async def _handle(self, job: dict):
+        task_id = job["plan_id"]
+        # Mọi log trong lúc xử lý job (kể cả heartbeat, model) mang task_id này
+        context_token = task_id_var.set(task_id)
+        heartbeat = None
+        try:
+            # Heartbeat tạo trong try: lỗi ở bất kỳ bước nào cũng huỷ nó ở finally, không để
+            # lock được gia hạn mãi cho một job không còn ai xử lý
+            heartbeat = asyncio.create_task(self._heartbeat(job))
+            # publish là best-effort (services/task_events.py), không làm đổi trạng thái job
+            await task_events.publish(task_id, "PROCESSING", attempts=job["attempts"])
+            await process_exchange(task_id, job["exchange_id"], job["attempts"], job["user_data"])
+            await task_events.publish(task_id, "COMPLETED")
+            logger.info("Exchange completed", extra={"exchange_id": job["exchange_id"], "attempts": job["attempts"]})
+        except Exception as e:
+            logger.warning(
+                "Exchange failed",
+                extra={"exchange_id": job["exchange_id"], "attempts": job["attempts"], "error": str(e)},
+            )
+            try:
+                retrying = await plan_queue.release_failed(job["exchange_id"], job["attempts"], str(e))
+            except Exception:
+                # Không ghi được trạng thái (thường cùng nguyên nhân với lỗi ban đầu, VD mất DB):
+                # heartbeat dừng ở finally, lock hết hạn và job được nhận lại hoặc bị reaper xử lý
+                logger.exception("Could not release failed exchange", extra={"exchange_id": job["exchange_id"]})
+            else:
+                await task_events.publish(task_id, "PENDING" if retrying else "FAILED", error=str(e))
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await heartbeat
+            task_id_var.reset(context_token)
+
+    async def _heartbeat(self, job: dict):
+        # Gia hạn lock định kỳ để job dài hơn visibility timeout không bị nhận trùng
+        interval = max(settings.VISIBILITY_TIMEOUT_S / 3, 1)
+        while True:
+            await asyncio.sleep(interval)
+            if not await plan_queue.heartbeat(job["exchange_id"], job["attempts"]):
+                return
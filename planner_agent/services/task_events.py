@@ -0,0 +1,95 @@
+"""
+Phát/nhận sự kiện đổi trạng thái task (PENDING -> PROCESSING -> COMPLETED/FAILED).
+
+- Backend "postgres" (mặc định): worker gửi NOTIFY, process API LISTEN bằng asyncpg rồi
+  chuyển tới các subscriber trong process. Dùng được khi worker chạy ở process khác.
+- Backend "memory": chỉ phát trong process, dùng khi worker chạy nhúng trong API.
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import os
+from urllib.parse import urlsplit, urlunsplit
+
+from core.config import settings
+from core.db import db
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "plan_task_events"
+TERMINAL_STATUSES = ("COMPLETED", "FAILED")
+# Payload NOTIFY tối đa 8000 byte; vượt quá thì chỉ gửi trạng thái, client đọc phần còn lại qua /result
+_NOTIFY_MAX_BYTES = 7900
+
+
+def _asyncpg_dsn() -> str:
+    # DATABASE_URL của Prisma có "?schema=public", asyncpg không hiểu tham số này
+    parts = urlsplit(os.environ["DATABASE_URL"])
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, "", ""))
+
+
+class TaskEventBus:
+    def __init__(self):
+        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+        self._connection = None
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self, task_id: str):
+        """Nhận sự kiện của một task qua asyncio.Queue trong phạm vi `async with`."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=100)
+        self._subscribers.setdefault(task_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers = self._subscribers.get(task_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[task_id]
+
+    def dispatch(self, event: dict):
+        for queue in self._subscribers.get(event.get("task_id"), ()):
+            with contextlib.suppress(asyncio.QueueFull):
+                queue.put_nowait(event)
+
+    async def publish(self, task_id: str, status: str, **fields):
+        """
+        Best-effort: lỗi phát sự kiện chỉ được log, không bao giờ ném ra ngoài, để trạng thái
+        của job (đã lưu trong DB) không phụ thuộc vào NOTIFY. Client vẫn đọc được qua /result.
+        """
+        event = {"task_id": task_id, "status": status, **fields}
+        try:
+            if settings.EVENTS_BACKEND != "postgres":
+                self.dispatch(event)
+                return
+            payload = json.dumps(event, ensure_ascii=False, default=str)
+            if len(payload.encode("utf-8")) > _NOTIFY_MAX_BYTES:
+                payload = json.dumps({"task_id": task_id, "status": status, "truncated": True})
+            # execute_raw thay vì query_raw: Prisma không đọc được cột kiểu void của pg_notify
+            await db.execute_raw("SELECT pg_notify($1, $2)", CHANNEL, payload)
+        except Exception as e:
+            logger.warning("Publish failed", extra={"task_id": task_id, "status": status, "error": str(e)})
+
+    async def start_listener(self):
+        if settings.EVENTS_BACKEND != "postgres" or self._connection is not None:
+            return
+        import asyncpg
+
+        self._connection = await asyncpg.connect(_asyncpg_dsn())
+        await self._connection.add_listener(CHANNEL, self._on_notify)
+
+    async def stop_listener(self):
+        if self._connection is None:
+            return
+        with contextlib.suppress(Exception):
+            await self._connection.remove_listener(CHANNEL, self._on_notify)
+        await self._connection.close()
+        self._connection = None
+
+    def _on_notify(self, connection, pid, channel, payload):
+        with contextlib.suppress(ValueError):
+            self.dispatch(json.loads(payload))
+
+
+task_events = TaskEventBus()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Module của planner_agent được import theo gốc thư mục (utils.*, services.*), giống khi chạy main.py
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,56 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from utils.plan_schema import WeeklyPlan
+from utils.plan_storage import InvalidPlanError, normalize_plan
+from utils.rule_planner import build_rule_plan, provisional_plan
+
+MOCK_DIR = Path(__file__).resolve().parents[2] / "mockData"
+
+
+@pytest.mark.parametrize("path", sorted(MOCK_DIR.glob("*.txt")), ids=lambda p: p.stem)
+def test_mock_outputs_are_accepted(path):
+    text = path.read_text(encoding="utf-8")
+    plan = json.loads(normalize_plan(text))
+
+    raw = json.loads(text)["data"]
+    # Trường không được kiểm tra vẫn giữ nguyên
+    assert plan["data"]["allocation_tree"] == raw["allocation_tree"]
+    assert plan["data"]["overview"] == raw["overview"]
+    # Tên trường cũ được chuẩn hoá
+    first_day = plan["data"]["daily_schedule"][0]
+    assert first_day["weekday_label"] == raw["daily_schedule"][0]["day_label"]
+    assert first_day["activities"][0]["label"] == raw["daily_schedule"][0]["activities"][0]["item_label"]
+
+
+def test_rule_plan_is_accepted():
+    plan = build_rule_plan({"thu_nhap_hang_thang": 20000000, "current_day": "Thứ Hai, 24/01/2026"})
+    WeeklyPlan.model_validate(plan)
+
+
+def test_missing_activity_amount_is_rejected():
+    plan = build_rule_plan({"thu_nhap_hang_thang": 20000000})
+    del plan["data"]["daily_schedule"][0]["activities"][0]["amount"]
+    with pytest.raises(InvalidPlanError):
+        normalize_plan(json.dumps(plan))
+
+
+def test_fenced_output_is_unwrapped():
+    plan = build_rule_plan({"thu_nhap_hang_thang": 20000000})
+    text = "```json\n" + json.dumps(plan, ensure_ascii=False) + "\n```"
+    assert json.loads(normalize_plan(text))["data"]["meta"] == plan["data"]["meta"]
+
+
+@pytest.mark.parametrize(
+    "user_data",
+    [
+        {"thu_nhap_hang_thang": "hai mươi triệu"},
+        {"thu_nhap_hang_thang": 20000000, "chi_tieu_bat_buoc": ["Tiền nhà"]},
+        None,
+    ],
+)
+def test_provisional_plan_tolerates_malformed_input(user_data):
+    plan = provisional_plan(user_data)
+    assert plan is None or WeeklyPlan.model_validate(plan)
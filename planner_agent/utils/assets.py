@@ -0,0 +1,13 @@
+"""
+Đọc file trong thư mục assets/ theo đường dẫn tuyệt đối (không phụ thuộc thư mục đang chạy)
+và chỉ đọc khi cần lần đầu.
+"""
+from functools import lru_cache
+from pathlib import Path
+
+ASSETS_DIR = Path(__file__).resolve().parent.parent / "assets"
+
+
+@lru_cache(maxsize=None)
+def load_asset(name: str) -> str:
+    return (ASSETS_DIR / name).read_text(encoding="utf-8")
@@ -0,0 +1,175 @@
+"""
+Backend sinh kế hoạch có thể thay thế (PLAN_MODEL_BACKEND).
+
+- "gemini" (mặc định): gọi Gemini qua client dùng chung (core/genai_client.py).
+- "fake": model giả chạy cục bộ, stream kế hoạch của utils/rule_planner (schema SYSTEM_INSTRUCTION.md)
+  với tốc độ token và tỉ lệ lỗi cấu hình được. Dùng để benchmark hàng đợi, streaming và
+  lưu DB end-to-end mà không cần mạng hay API key.
+
+Mỗi backend trả về một async iterator các chunk có `.text` và `.usage_metadata`
+(giống chunk của google-genai) để utils/planner.generate xử lý như nhau.
+"""
+import abc
+import asyncio
+import json
+import logging
+import random
+from types import SimpleNamespace
+from typing import AsyncIterator, Callable
+
+from core.config import settings
+from core.genai_client import model_client
+from utils.rule_planner import build_rule_plan
+
+logger = logging.getLogger(__name__)
+
+# Ước lượng ~4 ký tự / token cho model giả
+_CHARS_PER_TOKEN = 4
+
+
+class FakeModelError(RuntimeError):
+    """Lỗi giả lập của FakeBackend (theo PLAN_FAKE_ERROR_RATE)."""
+
+
+def _is_cache_miss(error: Exception) -> bool:
+    """Lỗi do context cache không còn (bị xoá/hết hạn phía server), không phải lỗi của model."""
+    from google.genai import errors
+
+    if not isinstance(error, errors.APIError):
+        return False
+    message = str(error.message or error).lower()
+    # 404 NOT_FOUND; cache hết hạn có thể về dạng 400/403 với thông báo nhắc tới cached content
+    return error.code == 404 or (error.code in (400, 403) and "cache" in message)
+
+
+class ModelBackend(abc.ABC):
+    name = "base"
+
+    @abc.abstractmethod
+    async def stream(self, user_data: dict, prompt: str) -> AsyncIterator:
+        """Mở stream sinh kế hoạch; trả về async iterator các chunk."""
+
+
+class GeminiBackend(ModelBackend):
+    """
+    Gemini qua client dùng chung. Khi bật PLAN_CONTEXT_CACHE, system instruction + tools được
+    tạo thành một context cache (caches.create) và mỗi request chỉ gửi prompt của user.
+    Tạo cache lỗi (model không hỗ trợ, nội dung dưới mức token tối thiểu...) thì gửi đầy đủ
+    như cũ và thử tạo lại sau CONTEXT_CACHE_RETRY_S.
+    """
+
+    name = "gemini"
+
+    def __init__(self, model: str, build_config: Callable, build_cache_config: Callable = None):
+        self.model = model
+        self.build_config = build_config
+        self.build_cache_config = build_cache_config
+        self._cache_name = None
+        self._cache_expires_at = 0.0
+        self._cache_retry_at = 0.0
+        self._cache_lock = asyncio.Lock()
+
+    async def _cached_content(self):
+        if not settings.CONTEXT_CACHE_ENABLED or self.build_cache_config is None:
+            return None
+        loop = asyncio.get_running_loop()
+        if self._cache_name and loop.time() < self._cache_expires_at:
+            return self._cache_name
+        if loop.time() < self._cache_retry_at:
+            return None
+
+        async with self._cache_lock:
+            if self._cache_name and loop.time() < self._cache_expires_at:
+                return self._cache_name
+            try:
+                cache = await model_client.client.aio.caches.create(
+                    model=self.model, config=self.build_cache_config()
+                )
+            except Exception as e:
+                logger.warning("Context cache unavailable, sending full system instruction", extra={"error": str(e)})
+                self._cache_name = None
+                self._cache_retry_at = loop.time() + settings.CONTEXT_CACHE_RETRY_S
+                return None
+            self._cache_name = cache.name
+            # Làm mới trước khi cache hết hạn phía server
+            self._cache_expires_at = loop.time() + settings.CONTEXT_CACHE_TTL_S * 0.9
+            return self._cache_name
+
+    async def stream(self, user_data: dict, prompt: str) -> AsyncIterator:
+        from google.genai import types
+
+        contents = [types.Content(role="user", parts=[types.Part.from_text(text=prompt)])]
+        cached_content = await self._cached_content()
+        try:
+            return await model_client.client.aio.models.generate_content_stream(
+                model=self.model,
+                contents=contents,
+                config=self.build_config(cached_content),
+            )
+        except Exception as e:
+            # Chỉ lỗi thiếu cache mới gửi lại; lỗi khác (429, 5xx, timeout...) để lớp resilience xử lý
+            if cached_content is None or not _is_cache_miss(e):
+                raise
+            logger.warning("Context cache missing on server, resending without cache", extra={"error": str(e)})
+            self._cache_name = None
+            return await model_client.client.aio.models.generate_content_stream(
+                model=self.model,
+                contents=contents,
+                config=self.build_config(None),
+            )
+
+
+class FakeBackend(ModelBackend):
+    """
+    Model giả: trễ kết nối, sau đó stream kế hoạch của utils/rule_planner theo từng chunk
+    `chunk_tokens` token với tốc độ `tokens_per_s`. Với xác suất `error_rate` stream bị ngắt giữa chừng bằng FakeModelError.
+    Cùng `seed` cho cùng chuỗi lỗi, nên kết quả benchmark lặp lại được.
+    """
+
+    name = "fake"
+
+    def __init__(self, tokens_per_s: float, chunk_tokens: int, error_rate: float,
+                 connect_latency_s: float, seed: int):
+        self.tokens_per_s = tokens_per_s
+        self.chunk_tokens = max(chunk_tokens, 1)
+        self.error_rate = error_rate
+        self.connect_latency_s = connect_latency_s
+        self._random = random.Random(seed)
+
+    async def stream(self, user_data: dict, prompt: str) -> AsyncIterator:
+        await asyncio.sleep(self.connect_latency_s)
+        text = json.dumps(build_rule_plan(user_data), ensure_ascii=False, indent=2)
+        # Quyết định lỗi ngay khi mở stream để chuỗi random không phụ thuộc thứ tự chunk
+        fail_at = self._random.random() * len(text) if self._random.random() < self.error_rate else None
+        return self._chunks(text, len(prompt) // _CHARS_PER_TOKEN, fail_at)
+
+    async def _chunks(self, text: str, prompt_tokens: int, fail_at):
+        step = self.chunk_tokens * _CHARS_PER_TOKEN
+        delay = self.chunk_tokens / self.tokens_per_s if self.tokens_per_s > 0 else 0
+        for start in range(0, len(text), step):
+            if fail_at is not None and start >= fail_at:
+                raise FakeModelError("Simulated model failure")
+            await asyncio.sleep(delay)
+            completion_tokens = min(start + step, len(text)) // _CHARS_PER_TOKEN
+            yield SimpleNamespace(
+                text=text[start:start + step],
+                usage_metadata=SimpleNamespace(
+                    prompt_token_count=prompt_tokens,
+                    candidates_token_count=completion_tokens,
+                    total_token_count=prompt_tokens + completion_tokens,
+                ),
+            )
+
+
+def create_backend(model: str, build_config: Callable, build_cache_config: Callable = None) -> ModelBackend:
+    if settings.MODEL_BACKEND == "fake":
+        return FakeBackend(
+            tokens_per_s=settings.FAKE_TOKENS_PER_S,
+            chunk_tokens=settings.FAKE_CHUNK_TOKENS,
+            error_rate=settings.FAKE_ERROR_RATE,
+            connect_latency_s=settings.FAKE_CONNECT_LATENCY_S,
+            seed=settings.FAKE_SEED,
+        )
+    if settings.MODEL_BACKEND != "gemini":
+        raise ValueError(f"Unknown PLAN_MODEL_BACKEND: {settings.MODEL_BACKEND!r}")
+    return GeminiBackend(model, build_config, build_cache_config)
@@ -0,0 +1,82 @@
+"""
+Cache kết quả sinh kế hoạch theo nội dung (content-addressed) + gộp request trùng (single-flight).
+
+Key là hash của prompt, model và cấu hình sinh (utils/planner.plan_cache_key), nên app gửi lại
+cùng user_data trong cùng tuần sẽ dùng lại kết quả thay vì gọi Gemini lần nữa. Các request
+giống nhau đến cùng lúc chỉ tạo một lần sinh, các request sau chờ chung kết quả đó.
+Cache nằm trong từng process worker.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from core.config import settings
+
+
+class PlanCache:
+    def __init__(self, ttl_s: float, max_entries: int):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_s, value)
+        self._entries.move_to_end(key)
+        # Bỏ các entry ít dùng nhất khi vượt giới hạn (LRU)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_generate(self, key: str, factory: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        """Trả kết quả trong cache, chờ lần sinh đang chạy với cùng key, hoặc gọi `factory`."""
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            # shield: request chờ bị huỷ không làm huỷ lần sinh dùng chung
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await factory()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # đánh dấu đã đọc, tránh cảnh báo khi không có request nào chờ
+            raise
+        else:
+            # Chỉ cache kết quả hợp lệ; kết quả rỗng vẫn trả cho các request đang chờ
+            if value:
+                self.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+
+plan_cache = PlanCache(ttl_s=settings.PLAN_CACHE_TTL_S, max_entries=settings.PLAN_CACHE_MAX_ENTRIES)
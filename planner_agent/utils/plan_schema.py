@@ -0,0 +1,55 @@
+"""
+Schema kế hoạch tuần theo phần OUTPUT FORMAT của SYSTEM_INSTRUCTION.md.
+
+Chỉ kiểm tra các trường mà phía đọc thật sự dùng (meta, daily_schedule[].activities[] với
+label/amount/category_id). Mọi trường khác (overview, allocation_tree, ...) và giá trị danh mục
+mới đều được giữ nguyên (extra="allow", category là str), để output lệch nhẹ so với prompt
+không làm hỏng cả lượt sinh rồi bị thay bằng kế hoạch theo quy tắc.
+Tên trường cũ của model (item_label, day_label, daily_total) được nhận và chuẩn hoá về tên mới.
+"""
+from typing import Any, Dict, List, Optional, Union
+
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field
+
+# Giữ nguyên int khi model trả số nguyên (không đổi 1000000 thành 1000000.0)
+Amount = Union[int, float]
+
+
+class _PlanModel(BaseModel):
+    model_config = ConfigDict(extra="allow", populate_by_name=True)
+
+
+class PlanActivity(_PlanModel):
+    category_id: str
+    label: str = Field(validation_alias=AliasChoices("label", "item_label"))
+    amount: Amount
+    type: Optional[str] = None
+
+
+class PlanDay(_PlanModel):
+    day_index: int = Field(ge=1, le=7)
+    weekday_label: Optional[str] = Field(default=None, validation_alias=AliasChoices("weekday_label", "day_label"))
+    is_start_of_plan: bool = False
+    daily_total_planned: Optional[Amount] = Field(
+        default=None, validation_alias=AliasChoices("daily_total_planned", "daily_total")
+    )
+    activities: List[PlanActivity] = Field(default_factory=list)
+
+
+class PlanMeta(_PlanModel):
+    currency: str = "VND"
+    period: Optional[str] = None
+    start_date_label: Optional[str] = None
+    end_date_label: Optional[str] = None
+
+
+class PlanData(_PlanModel):
+    meta: PlanMeta
+    # Chỉ hiển thị, không đọc theo trường: giữ nguyên như model trả về
+    overview: Dict[str, Any] = Field(default_factory=dict)
+    daily_schedule: List[PlanDay] = Field(min_length=1, max_length=7)
+
+
+class WeeklyPlan(_PlanModel):
+    status: str = "success"
+    data: PlanData
@@ -0,0 +1,52 @@
+"""
+Chuẩn hoá kế hoạch khi ghi và trả kết quả khi đọc mà không parse lại JSON.
+
+- Ghi: `normalize_plan` kiểm tra text của model với utils/plan_schema.WeeklyPlan một lần duy nhất
+  và trả về JSON gọn (compact) để lưu vào cột JSONB "planData". Output sai schema ném
+  InvalidPlanError để worker thử lại.
+- Đọc: "planData" được lấy ra dưới dạng text (::text) và bọc trong RawJSON; `render_json`
+  ghép thẳng chuỗi đó vào response, mỗi lần poll không phải json.loads/json.dumps kế hoạch.
+"""
+import json
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
+
+from utils.plan_schema import WeeklyPlan
+
+
+class InvalidPlanError(ValueError):
+    """Output của model không phải JSON hoặc không đúng schema kế hoạch."""
+
+
+class RawJSON(str):
+    """Chuỗi JSON đã serialize sẵn, được ghép nguyên văn khi render."""
+
+
+def _strip_fences(text: str) -> str:
+    # Model đôi khi bọc JSON trong ```json ... ```
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        raise InvalidPlanError("Model output contains no JSON object")
+    return text[start:end + 1]
+
+
+def normalize_plan(text: str) -> str:
+    """Validate output của model, trả về JSON gọn của kế hoạch."""
+    try:
+        plan = WeeklyPlan.model_validate_json(_strip_fences(text or ""))
+    except ValidationError as e:
+        raise InvalidPlanError(f"Plan does not match schema: {e.error_count()} error(s), first: {e.errors()[0]['msg']}") from e
+    return plan.model_dump_json()
+
+
+def render_json(payload: dict) -> str:
+    """json.dumps cho dict có giá trị RawJSON ở cấp ngoài cùng (ghép nguyên văn, không parse)."""
+    raw = {key: value for key, value in payload.items() if isinstance(value, RawJSON)}
+    if not raw:
+        return json.dumps(jsonable_encoder(payload), ensure_ascii=False)
+
+    rest = {key: value for key, value in payload.items() if key not in raw}
+    parts = [json.dumps(jsonable_encoder(rest), ensure_ascii=False)[1:-1]]
+    parts += [f"{json.dumps(key)}:{value}" for key, value in raw.items()]
+    return "{" + ",".join(part for part in parts if part) + "}"
@@ -0,0 +1,120 @@
+"""
+Parser JSON tăng dần cho kế hoạch đang được model stream.
+
+Model trả JSON theo SYSTEM_INSTRUCTION.md ({"status", "data": {"meta", "overview",
+"daily_schedule": [...]}}). Mỗi lần `feed` một chunk, parser trả về các phần đã đóng
+ngoặc đầy đủ (meta, overview, từng ngày của daily_schedule) để gửi cho app ngay.
+"""
+import json
+
+# Đường dẫn (trong JSON) của các phần cần trả ra sớm -> tên phần
+_SECTIONS = {
+    ("data", "meta"): "meta",
+    ("data", "overview"): "overview",
+}
+_DAY_PARENT = ("data", "daily_schedule")
+
+
+class _Frame:
+    __slots__ = ("kind", "path", "start", "key", "index", "expect_key")
+
+    def __init__(self, kind: str, path: tuple, start: int):
+        self.kind = kind          # "obj" hoặc "arr"
+        self.path = path          # đường dẫn tới chính container này
+        self.start = start        # vị trí ký tự mở ngoặc trong buffer
+        self.key = None           # key hiện tại (obj)
+        self.index = 0            # phần tử hiện tại (arr)
+        self.expect_key = kind == "obj"
+
+    def child_path(self) -> tuple:
+        return self.path + ((self.key,) if self.kind == "obj" else (self.index,))
+
+
+class IncrementalPlanParser:
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._stack: list[_Frame] = []
+        self._started = False
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self.done = False
+
+    @property
+    def text(self) -> str:
+        return self._buffer
+
+    def feed(self, chunk: str) -> list[dict]:
+        """Thêm một đoạn text, trả về các phần vừa hoàn chỉnh (theo thứ tự xuất hiện)."""
+        self._buffer += chunk
+        sections = []
+        buffer = self._buffer
+
+        while self._pos < len(buffer) and not self.done:
+            pos = self._pos
+            char = buffer[pos]
+            self._pos += 1
+
+            if not self._started:
+                # Bỏ qua phần mở đầu như ```json trước dấu { đầu tiên
+                if char == "{":
+                    self._started = True
+                    self._stack.append(_Frame("obj", (), pos))
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    frame = self._stack[-1]
+                    if frame.kind == "obj" and frame.expect_key:
+                        frame.key = json.loads(buffer[self._string_start:pos + 1])
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif char in "{[":
+                parent = self._stack[-1]
+                self._stack.append(_Frame("obj" if char == "{" else "arr", parent.child_path(), pos))
+            elif char in "}]":
+                frame = self._stack.pop()
+                if not self._stack:
+                    self.done = True
+                    continue
+                section = self._section(frame, buffer[frame.start:pos + 1])
+                if section:
+                    sections.append(section)
+            elif char == ":":
+                self._stack[-1].expect_key = False
+            elif char == ",":
+                frame = self._stack[-1]
+                if frame.kind == "obj":
+                    frame.expect_key = True
+                else:
+                    frame.index += 1
+
+        return sections
+
+    @staticmethod
+    def _section(frame: _Frame, raw: str):
+        if frame.path in _SECTIONS:
+            name = _SECTIONS[frame.path]
+        elif frame.path[:-1] == _DAY_PARENT and frame.kind == "obj":
+            name = "day"
+        else:
+            return None
+
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            return None
+
+        section = {"section": name, "data": value}
+        if name == "day":
+            section["index"] = frame.path[-1]
+        return section
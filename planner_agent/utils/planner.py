@@ -1,16 +1,35 @@
 # To run this code you need to install the following dependencies:
 # pip install google-genai
 
-import base64
-import os
-from google import genai
-from google.genai import types
-import json
 import asyncio
+import contextlib
+import json
+import hashlib
+import logging
+import time
+from functools import lru_cache
+from core.config import settings
+from core.genai_client import model_client
+from utils.assets import load_asset
+from utils.model_backends import create_backend
+from utils.plan_stream import IncrementalPlanParser
+from utils.resilience import CircuitBreaker, CircuitOpenError, ModelTimeout, backoff_delay, is_retryable
+
+logger = logging.getLogger(__name__)
+
+def system_instruction() -> str:
+    # Đọc file markdown system instruction khi cần lần đầu (utils/assets.py)
+    return load_asset("SYSTEM_INSTRUCTION.md")
+
+MODEL = "gemini-flash-latest"
 
-# Đọc file markdown system instruction
-with open("assets/SYSTEM_INSTRUCTION.md", "r", encoding="utf-8") as f:
-    SYSTEM_INSTRUCTION = f.read()
+# Tham số sinh, dùng chung cho GenerateContentConfig và cache key
+GENERATION_PARAMS = {
+    "temperature": 0.5,
+    "thinking_budget": -1,
+    "media_resolution": "MEDIA_RESOLUTION_MEDIUM",
+    "tools": ["google_search"],
+}
 
 def generate_financial_prompt(user_data: dict):
     """
@@ -70,48 +89,231 @@ Hồ sơ khách hàng
 """
     return prompt_template.strip()
 
-async def generate(user_data):
-    client = genai.Client(
-        api_key=os.getenv("GEMINI_API_KEY"),
-    )
+@lru_cache(maxsize=1)
+def _static_key() -> str:
+    # Phần tĩnh của cache key (system instruction ~4.6KB, model, tham số) chỉ hash một lần
+    return hashlib.sha256(
+        json.dumps(
+            {
+                "backend": settings.MODEL_BACKEND,
+                "model": MODEL,
+                "params": GENERATION_PARAMS,
+                "system_instruction": system_instruction(),
+            },
+            ensure_ascii=False,
+            sort_keys=True,
+        ).encode("utf-8")
+    ).hexdigest()
 
-    model = "gemini-flash-latest"
+def plan_cache_key(user_data: dict) -> str:
+    """Hash chuẩn hoá của prompt + system instruction + model + tham số sinh."""
+    prompt = generate_financial_prompt(user_data)
+    return hashlib.sha256(f"{_static_key()}\n{prompt}".encode("utf-8")).hexdigest()
 
-    contents = [
-        types.Content(
-            role="user",
-            parts=[
-                types.Part.from_text(text=generate_financial_prompt(user_data)),
-            ],
-        ),
-    ]
-    tools = [
+def _elapsed_ms(started: float) -> int:
+    return int((time.perf_counter() - started) * 1000)
+
+# google.genai import mất vài trăm ms nên chỉ import khi thật sự gọi Gemini
+def _tools():
+    from google.genai import types
+
+    return [
         types.Tool(googleSearch=types.GoogleSearch(
         )),
     ]
-    generate_content_config = types.GenerateContentConfig(
-        temperature=0.5,
+
+def _generation_config(cached_content=None):
+    from google.genai import types
+
+    params = dict(
+        temperature=GENERATION_PARAMS["temperature"],
         thinking_config=types.ThinkingConfig(
-            thinking_budget=-1,
+            thinking_budget=GENERATION_PARAMS["thinking_budget"],
         ),
-        media_resolution="MEDIA_RESOLUTION_MEDIUM",
-        tools=tools,
+        media_resolution=GENERATION_PARAMS["media_resolution"],
+    )
+    if cached_content:
+        # System instruction và tools đã nằm trong context cache, chỉ gửi phần hồ sơ user
+        return types.GenerateContentConfig(cached_content=cached_content, **params)
+    return types.GenerateContentConfig(
+        tools=_tools(),
         system_instruction=[
-            types.Part.from_text(text=SYSTEM_INSTRUCTION),
+            types.Part.from_text(text=system_instruction()),
         ],
+        **params,
     )
 
+def _context_cache_config():
+    from google.genai import types
+
+    return types.CreateCachedContentConfig(
+        display_name="planner-system-instruction",
+        system_instruction=system_instruction(),
+        tools=_tools(),
+        ttl=f"{int(settings.CONTEXT_CACHE_TTL_S)}s",
+    )
+
+# Chọn theo PLAN_MODEL_BACKEND ("gemini" | "fake")
+backend = create_backend(MODEL, _generation_config, _context_cache_config)
+
+breaker = CircuitBreaker(
+    window_s=settings.BREAKER_WINDOW_S,
+    min_calls=settings.BREAKER_MIN_CALLS,
+    error_rate=settings.BREAKER_ERROR_RATE,
+    open_s=settings.BREAKER_OPEN_S,
+)
+
+async def _open_stream(user_data, prompt, started):
+    """Mở stream và chờ chunk đầu tiên; trả về (iterator, chunk đầu tiên hoặc None, connect_ms)."""
+    stream = await backend.stream(user_data, prompt)
+    connect_ms = _elapsed_ms(started)
+    iterator = stream.__aiter__()
+    try:
+        first = await iterator.__anext__()
+    except StopAsyncIteration:
+        first = None
+    return iterator, first, connect_ms
+
+async def _discard(tasks):
+    # Huỷ các lần mở stream không dùng tới (thua hedge / quá hạn), đóng stream nếu đã mở xong
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        try:
+            iterator, _, _ = await task
+        except BaseException:
+            continue
+        aclose = getattr(iterator, "aclose", None)
+        if aclose:
+            with contextlib.suppress(Exception):
+                await aclose()
+
+async def _first_chunk(user_data, prompt, started, stats):
+    """
+    Chờ chunk đầu tiên trong MODEL_FIRST_CHUNK_TIMEOUT_S. Nếu bật MODEL_HEDGE_AFTER_S và request
+    đầu chưa có chunk sau khoảng đó, gửi thêm một request giống hệt; bên nào có chunk trước được dùng.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.MODEL_FIRST_CHUNK_TIMEOUT_S
+    hedge_at = loop.time() + settings.MODEL_HEDGE_AFTER_S if settings.MODEL_HEDGE_AFTER_S > 0 else None
+    tasks = {asyncio.create_task(_open_stream(user_data, prompt, started))}
+    last_error = None
+    try:
+        while tasks:
+            wake_at = deadline if hedge_at is None else min(deadline, hedge_at)
+            done, _ = await asyncio.wait(
+                tasks, timeout=max(wake_at - loop.time(), 0), return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                tasks.discard(task)
+                if task.exception() is None:
+                    return task.result()
+                last_error = task.exception()
+
+            if hedge_at is not None and loop.time() >= hedge_at:
+                hedge_at = None
+                if tasks:
+                    tasks.add(asyncio.create_task(_open_stream(user_data, prompt, started)))
+                    stats["hedged"] = True
+            elif tasks and loop.time() >= deadline:
+                raise ModelTimeout(f"No first chunk within {settings.MODEL_FIRST_CHUNK_TIMEOUT_S}s")
+        raise last_error
+    finally:
+        await _discard(tasks)
+
+async def _stream_plan(user_data, prompt, on_section, stats, started):
+    # Thử lại (backoff) khi lỗi tạm thời xảy ra trước chunk đầu tiên. Lỗi giữa stream thì để
+    # hàng đợi thử lại cả lượt, tránh gửi trùng các phần đã phát cho client.
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            iterator, first, stats["connect_ms"] = await _first_chunk(user_data, prompt, started, stats)
+            break
+        except Exception as e:
+            if attempt > settings.MODEL_RETRIES or not is_retryable(e):
+                raise
+            stats["retries"] = attempt
+            logger.warning("Model attempt failed, retrying", extra={"attempt": attempt, "error": repr(e)})
+            await asyncio.sleep(backoff_delay(attempt, settings.MODEL_RETRY_BACKOFF_S, settings.MODEL_RETRY_BACKOFF_MAX_S))
+
     full_response_text = ""
+    parser = IncrementalPlanParser()
+    stats["first_chunk_ms"] = _elapsed_ms(started)
+    stats["chunk_count"] = 0
+
+    async def consume(chunk):
+        nonlocal full_response_text
+        stats["chunk_count"] += 1
+        # usage_metadata cộng dồn, chunk cuối có số liệu đầy đủ
+        usage = getattr(chunk, "usage_metadata", None)
+        if usage:
+            stats["prompt_tokens"] = usage.prompt_token_count
+            stats["completion_tokens"] = usage.candidates_token_count
+            stats["total_tokens"] = usage.total_token_count
+            # Token prompt đọc từ context cache (tính phí thấp hơn), tức phần tiết kiệm được
+            stats["cached_tokens"] = getattr(usage, "cached_content_token_count", None)
+        if chunk.text:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "Model chunk",
+                    extra={"chunk": stats["chunk_count"], "chars": len(chunk.text), "sample_rate": settings.LOG_CHUNK_SAMPLE_RATE},
+                )
+            full_response_text += chunk.text
+            if on_section:
+                for section in parser.feed(chunk.text):
+                    await on_section(section)
+
+    if first is not None:
+        await consume(first)
+        async for chunk in iterator:
+            await consume(chunk)
+    return full_response_text
+
+async def generate(user_data, on_section=None, stats=None):
+    """
+    Stream kế hoạch từ model và trả về toàn bộ text.
+    on_section: coroutine nhận từng phần đã hoàn chỉnh (meta, overview, từng ngày) khi đang stream.
+    stats: dict (tuỳ chọn) nhận số liệu của lần sinh:
+        queue_ms (chờ semaphore), connect_ms (tới khi stream mở),
+        first_chunk_ms (tới chunk đầu tiên), total_ms, chunk_count,
+        prompt_tokens, completion_tokens, total_tokens, cached_tokens (từ usage_metadata),
+        retries, hedged.
+    Lỗi được ném ra: ModelTimeout khi quá MODEL_FIRST_CHUNK_TIMEOUT_S / MODEL_DEADLINE_S,
+    CircuitOpenError khi breaker đang mở (service chuyển sang kế hoạch theo quy tắc).
+    """
+    stats = stats if stats is not None else {}
+    prompt = generate_financial_prompt(user_data)
+
+    if not breaker.allow():
+        raise CircuitOpenError("Model circuit breaker is open")
+
+    succeeded = None
     try:
-        async for chunk in await client.aio.models.generate_content_stream(
-            model=model,
-            contents=contents,
-            config=generate_content_config,
-        ):
-            if chunk.text:
-                print(chunk.text, end="")
-                full_response_text += chunk.text
+        queued_at = time.perf_counter()
+        async with model_client.semaphore:
+            started = time.perf_counter()
+            stats["queue_ms"] = int((started - queued_at) * 1000)
+            try:
+                full_response_text = await asyncio.wait_for(
+                    _stream_plan(user_data, prompt, on_section, stats, started),
+                    settings.MODEL_DEADLINE_S,
+                )
+            except ModelTimeout:
+                succeeded = False
+                raise
+            except asyncio.TimeoutError as e:
+                succeeded = False
+                raise ModelTimeout(f"Generation exceeded {settings.MODEL_DEADLINE_S}s") from e
+            except Exception:
+                succeeded = False
+                raise
+            stats["total_ms"] = _elapsed_ms(started)
 
+        succeeded = bool(full_response_text)
         return full_response_text
-    except Exception as e:
-        print(f"Error during generation: {e}")
+    finally:
+        if succeeded is None:
+            breaker.abort()
+        else:
+            breaker.record(succeeded)
@@ -0,0 +1,101 @@
+"""
+Các thành phần chống lỗi quanh lời gọi model (dùng trong utils/planner.generate).
+
+- ModelTimeout: quá hạn chờ chunk đầu tiên hoặc quá hạn tổng của một lần sinh.
+- is_retryable / backoff_delay: lỗi tạm thời (timeout, mất kết nối, 429/5xx) được thử lại ngay
+  trong worker với exponential backoff + jitter.
+- CircuitBreaker: tỉ lệ lỗi trong cửa sổ thời gian vượt ngưỡng thì "mở", các lần sinh sau ném
+  CircuitOpenError ngay (không chờ model) để service dùng kế hoạch theo quy tắc. Sau `open_s`
+  cho một request thử (half-open); thành công thì đóng lại.
+"""
+import asyncio
+import random
+import time
+from collections import deque
+
+_RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class ModelTimeout(asyncio.TimeoutError):
+    """Model không trả chunk đầu tiên / không xong trong thời hạn."""
+
+
+class CircuitOpenError(RuntimeError):
+    """Circuit breaker đang mở: bỏ qua model, dùng phương án dự phòng."""
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    # google.genai.errors.APIError có .code (HTTP status)
+    code = getattr(exc, "code", None)
+    if isinstance(code, int):
+        return code in _RETRYABLE_STATUS
+    # Lỗi mạng của httpx (không import httpx chỉ để kiểm tra kiểu)
+    if type(exc).__module__.startswith("httpx") and type(exc).__name__ in (
+        "ConnectError", "ReadError", "WriteError", "RemoteProtocolError", "ReadTimeout", "ConnectTimeout", "PoolTimeout",
+    ):
+        return True
+    # Lỗi giả lập của model "fake" (utils/model_backends.FakeModelError)
+    return type(exc).__name__ == "FakeModelError"
+
+
+def backoff_delay(attempt: int, base_s: float, max_s: float) -> float:
+    """Exponential backoff có full jitter cho lần thử lại thứ `attempt` (bắt đầu từ 1)."""
+    return random.uniform(0, min(max_s, base_s * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    def __init__(self, window_s: float, min_calls: int, error_rate: float, open_s: float):
+        self.window_s = window_s
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.open_s = open_s
+        self._calls: deque[tuple[float, bool]] = deque()  # (thời điểm, thành công?)
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.open_s:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            # Chỉ một request thử trong lúc half-open
+            self._probing = True
+            return True
+        return False
+
+    def record(self, success: bool):
+        now = time.monotonic()
+        if self._opened_at is not None:
+            self._probing = False
+            if success:
+                self._opened_at = None
+                self._calls.clear()
+            else:
+                self._opened_at = now
+            return
+
+        self._calls.append((now, success))
+        while self._calls and now - self._calls[0][0] > self.window_s:
+            self._calls.popleft()
+
+        failures = sum(1 for _, ok in self._calls if not ok)
+        if len(self._calls) >= self.min_calls and failures / len(self._calls) >= self.error_rate:
+            self._opened_at = now
+
+    def abort(self):
+        """Lần gọi bị huỷ giữa chừng (không tính thành công hay lỗi): trả lại lượt thử half-open."""
+        self._probing = False
+
+    def snapshot(self) -> dict:
+        failures = sum(1 for _, ok in self._calls if not ok)
+        return {"state": self.state, "calls": len(self._calls), "failures": failures}
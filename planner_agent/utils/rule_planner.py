@@ -0,0 +1,191 @@
+"""
+Sinh kế hoạch tuần bằng quy tắc (không gọi model), theo đúng schema output của SYSTEM_INSTRUCTION.md.
+
+Áp dụng các quy tắc cố định trong SYSTEM_INSTRUCTION.md:
+- Thu nhập/chi phí tháng chia 4 để ra định mức tuần.
+- Pay yourself first: ngày 1 trích ngay quỹ tích luỹ (CAT_INVEST) và ví hưởng thụ (CAT_LIFESTYLE).
+- Sinh hoạt phí (ăn uống, đi lại) chia đều 7 ngày; hoá đơn và trả nợ trích lập vào ngày 7.
+
+Chạy trong vài ms nên dùng làm kế hoạch tạm (provisional) trả ngay cho app trong lúc model
+sinh bản chi tiết, và làm phương án dự phòng khi model lỗi/hết thời gian.
+"""
+import logging
+import re
+from datetime import date, timedelta
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+GENERATOR = "rules"
+
+_WEEKDAYS = ["Thứ Hai", "Thứ Ba", "Thứ Tư", "Thứ Năm", "Thứ Sáu", "Thứ Bảy", "Chủ Nhật"]
+_DATE_RE = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4})")
+
+# Phân loại khoản chi bắt buộc theo tên
+_DEBT_KEYWORDS = ("nợ", "trả góp", "vay", "tín dụng")
+_SUBSISTENCE_KEYWORDS = ("ăn", "sinh hoạt", "xăng", "đi lại", "chợ")
+
+# Tỉ lệ phân bổ phần còn dư sau chi bắt buộc
+_LIFESTYLE_SHARE_OF_INCOME = 0.10
+_LIFESTYLE_SHARE_OF_FREE = 0.25
+_INVEST_SHARE_OF_FREE = 0.6
+_INVEST_SHARE_WITH_GOAL = 0.7
+
+
+def _round_k(amount: float) -> int:
+    # Làm tròn xuống bội số 1.000 VNĐ
+    return int(amount // 1000 * 1000)
+
+
+def _monthly_amount(item: dict) -> float:
+    amount = float(item.get("uoc_tinh") or 0)
+    frequency = (item.get("tan_suat") or "").lower()
+    if "tuần" in frequency:
+        return amount * 4
+    if "ngày" in frequency:
+        return amount * 30
+    if "năm" in frequency:
+        return amount / 12
+    return amount
+
+
+def _classify(name: str) -> str:
+    name = name.lower()
+    if any(keyword in name for keyword in _DEBT_KEYWORDS):
+        return "CAT_DEBT"
+    if any(keyword in name for keyword in _SUBSISTENCE_KEYWORDS):
+        return "CAT_MANDATORY"
+    return "BILL"
+
+
+def _start_date(current_day) -> date:
+    # "Thứ Hai, 24/01/2026" -> kế hoạch bắt đầu từ ngày mai
+    match = _DATE_RE.search(str(current_day or ""))
+    today = date.today()
+    if match:
+        day, month, year = (int(part) for part in match.groups())
+        try:
+            today = date(year, month, day)
+        except ValueError:
+            pass
+    return today + timedelta(days=1)
+
+
+def _day_label(day: date) -> str:
+    return f"{_WEEKDAYS[day.weekday()]} ({day:%d/%m})"
+
+
+def _health_status(free: int, invest: int, income: int) -> str:
+    if free < 0:
+        return "CRITICAL"
+    if invest <= 0 or income <= 0:
+        return "WARNING"
+    ratio = invest / income
+    if ratio > 0.3:
+        return "EXCELLENT"
+    if ratio >= 0.1:
+        return "HEALTHY"
+    return "WARNING"
+
+
+def _advice(status: str, invest: int, goal) -> str:
+    if status == "CRITICAL":
+        return "Chi bắt buộc đang vượt thu nhập tuần. Ngày mai hãy rà soát và cắt giảm các khoản không thiết yếu."
+    if status == "WARNING":
+        return "Tuần này chưa dư để tích luỹ. Giữ đúng định mức ăn uống mỗi ngày để cuối tuần còn dư."
+    target = f" cho mục tiêu: {goal}" if goal else " vào quỹ dự phòng khẩn cấp"
+    amount = f"{invest:,}".replace(",", ".")
+    return f"Ngày mai trích ngay {amount} VNĐ{target}, phần còn lại chi theo định mức từng ngày."
+
+
+def build_rule_plan(user_data: dict) -> dict:
+    """Kế hoạch 7 ngày (dict theo schema SYSTEM_INSTRUCTION.md) từ input của /generate-plan."""
+    income = _round_k(float(user_data.get("thu_nhap_hang_thang") or 0) / 4)
+
+    subsistence = debt = bills = 0.0
+    for item in user_data.get("chi_tieu_bat_buoc") or []:
+        weekly = _monthly_amount(item) / 4
+        category = _classify(item.get("ten_chi_tieu") or "")
+        if category == "CAT_DEBT":
+            debt += weekly
+        elif category == "CAT_MANDATORY":
+            subsistence += weekly
+        else:
+            bills += weekly
+
+    # chi_tieu_phat_sinh: <= 100 hiểu là % thu nhập, lớn hơn là số tiền/tháng
+    extra = float(user_data.get("chi_tieu_phat_sinh") or 0)
+    subsistence += income * extra / 100 if extra <= 100 else extra / 4
+
+    subsistence, debt, bills = _round_k(subsistence), _round_k(debt), _round_k(bills)
+    mandatory = subsistence + debt + bills
+    free = income - mandatory
+
+    lifestyle = invest = 0
+    if free > 0:
+        lifestyle = _round_k(min(income * _LIFESTYLE_SHARE_OF_INCOME, free * _LIFESTYLE_SHARE_OF_FREE))
+        share = _INVEST_SHARE_WITH_GOAL if user_data.get("muc_tieu") else _INVEST_SHARE_OF_FREE
+        invest = _round_k((free - lifestyle) * share)
+    # Phần dư còn lại bổ sung vào định mức sinh hoạt hằng ngày
+    daily = _round_k((subsistence + max(free, 0) - lifestyle - invest) / 7)
+
+    start = _start_date(user_data.get("current_day"))
+    schedule = []
+    for index in range(7):
+        day = start + timedelta(days=index)
+        activities = []
+        if index == 0:
+            if invest:
+                activities.append({"category_id": "CAT_INVEST", "label": "Trích quỹ đầu tư tuần", "amount": invest, "type": "AUTO_DEDUCT"})
+            if lifestyle:
+                activities.append({"category_id": "CAT_LIFESTYLE", "label": "Cấp vốn ví Ăn chơi/Mua sắm", "amount": lifestyle, "type": "ALLOCATION"})
+        activities.append({"category_id": "CAT_MANDATORY", "label": "Ăn uống & Xăng xe", "amount": daily, "type": "SPENDING"})
+        if index == 6:
+            if bills:
+                activities.append({"category_id": "CAT_MANDATORY", "label": "Trích lập hoá đơn cố định", "amount": bills, "type": "BILL_RESERVE"})
+            if debt:
+                activities.append({"category_id": "CAT_DEBT", "label": "Trích lập trả nợ", "amount": debt, "type": "BILL_RESERVE"})
+
+        schedule.append({
+            "day_index": index + 1,
+            "weekday_label": _WEEKDAYS[day.weekday()],
+            "is_start_of_plan": index == 0,
+            "daily_total_planned": sum(activity["amount"] for activity in activities),
+            "activities": activities,
+        })
+
+    status = _health_status(free, invest, income)
+    return {
+        "status": "success",
+        "data": {
+            "meta": {
+                "currency": "VND",
+                "period": "NEXT_7_DAYS",
+                "start_date_label": _day_label(start),
+                "end_date_label": _day_label(start + timedelta(days=6)),
+                "generator": GENERATOR,
+            },
+            "overview": {
+                "total_income_weekly": income,
+                "total_mandatory_cost": mandatory,
+                "invest_amount_deducted_early": invest,
+                "lifestyle_amount_allocated": lifestyle,
+                "daily_subsistence_allowance": daily,
+                "health_status": status,
+                "advice": _advice(status, invest, user_data.get("muc_tieu")),
+            },
+            "daily_schedule": schedule,
+        },
+    }
+
+
+def provisional_plan(user_data) -> Optional[dict]:
+    """
+    build_rule_plan cho phần kế hoạch tạm trả kèm response: input sai kiểu (thu nhập dạng chuỗi,
+    khoản chi không phải dict...) chỉ làm mất bản tạm (None), không làm request lỗi 500.
+    """
+    try:
+        return build_rule_plan(user_data)
+    except Exception as e:
+        logger.warning("Provisional plan unavailable", extra={"error": repr(e)})
+        return None
@@ -0,0 +1,28 @@
+# Chạy worker sinh kế hoạch tách khỏi API: python worker.py
+# (đặt PLAN_EMBEDDED_WORKER=false cho process API để hai bên scale độc lập)
+import asyncio
+
+from core.config import settings
+from core.db import db
+from core.genai_client import model_client
+from core.log import setup_logging, shutdown_logging
+from services.plan_worker import PlanWorker
+
+
+async def main():
+    setup_logging()
+    await db.connect()
+    if settings.MODEL_BACKEND == "gemini":
+        model_client.start()
+    worker = PlanWorker()
+    try:
+        await worker.run_forever()
+    finally:
+        await worker.stop()
+        await model_client.close()
+        await db.disconnect()
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())